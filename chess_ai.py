@@ -1,11 +1,25 @@
 '''
 Chess AI
 '''
+import collections
+import multiprocessing
 import random
+import time
+import chess_engine, chess_tablebase
 
 CHECKMATE = 10000
 STALEMATE = -100
+DRAW = 0 # repetition and fifty move draws
+TABLEBASE_WIN = CHECKMATE - 1000 # minus the distance to mate, so a real mate in the tree still scores higher
 DEPTH = 4
+TT_SIZE_MB = 64 # memory budget for the transposition table
+TIME_LIMIT = 3.0 # seconds per move for iterative deepening
+MAX_DEPTH = 64 # deepest iterative deepening will go when it has a budget
+MOVE_ORDERING = True # hash move, MVV-LVA, killers and history before searching a node's moves (quiescence always sorts)
+DELTA_MARGIN = 2 # quiescence skips captures that can't get within this many pawns of alpha
+VERBOSE = True # the module level search functions print the node count after every search
+WORKERS = 0 # processes for find_best_move_parallel, 0 means one per core
+EVAL_CACHE_SIZE = 0 # positions in the static evaluation cache, 0 turns it off
 
 
 piece_scores = {"K":0, "Q":9, "R":5, "B":3, "N":3, "p":1}
@@ -102,9 +116,28 @@ def score_material(board):
                 score -= piece_scores[square[1]]
     return score
 
+'''
+scores are kept in tenths of a pawn so they stay whole numbers: every piece is worth
+10 * piece_scores plus 3 * its piece_position_scores entry (the old 0.3 weighting).
+piece_square_values has that value for every piece on every square, white positive and
+black negative. both kings use the king table here, score_board swaps that for the
+enemy king term late in the game
+'''
+def build_piece_square_values():
+    values = {}
+    for color, sign in (("w", 1), ("b", -1)):
+        for piece in "pRNBQK":
+            table = piece_position_scores[color + piece if piece == "p" else piece]
+            values[color + piece] = [sign * (10 * piece_scores[piece] + 3 * table[sq // 8][sq % 8]) for sq in range(64)]
+    return values
+
+piece_square_values = build_piece_square_values()
+
 '''
 better board scoring
 a positive score is good for white, negative is good for black
+material and piece square totals come from the game state, which updates them in make_move
+and undo_move, so this is O(1) apart from the endgame king term
 '''
 def score_board(gs):
     if gs.checkmate:
@@ -114,17 +147,33 @@ def score_board(gs):
             return CHECKMATE # white wins
     elif gs.stalemate:
         return STALEMATE
-    
+    if gs.piece_square_values is not piece_square_values: # first time this game state is scored
+        gs.set_piece_square_values(piece_square_values)
+    score = gs.eval_score
+    if gs.turn_counter > 70: # only the enemy king counts now, to drive it to the edge
+        white_king = 3 * piece_position_scores["K"][gs.white_king_location[0]][gs.white_king_location[1]]
+        black_king = 3 * piece_position_scores["K"][gs.black_king_location[0]][gs.black_king_location[1]]
+        score -= white_king - black_king # take out both kings' eval_score values
+        if gs.white_to_move:
+            score -= black_king
+        else:
+            score += white_king
+    return score / 10
+
+# same score from a full scan of the board, chess_headless check tests the incremental totals against it
+def score_board_full(gs):
+    if gs.checkmate:
+        return -CHECKMATE if gs.white_to_move else CHECKMATE
+    elif gs.stalemate:
+        return STALEMATE
     score = 0
     for row in range(len(gs.board)):
         for col in range(len(gs.board[row])):
             square = gs.board[row][col]
             if square != "--":
                 #score it positionally
-                if square[1] == "K" and gs.turn_counter > 70: 
-                    if gs.white_to_move and square[0] == "b":
-                        piece_position_score = piece_position_scores[square[1]][row][col]
-                    elif not gs.white_to_move and square[0] == "w":
+                if square[1] == "K" and gs.turn_counter > 70:
+                    if square[0] == ("b" if gs.white_to_move else "w"):
                         piece_position_score = piece_position_scores[square[1]][row][col]
                     else:
                         piece_position_score = 0
@@ -134,12 +183,10 @@ def score_board(gs):
                     piece_position_score = piece_position_scores[square[1]][row][col] # all other pieces
             
                 if square[0] == "w":
-                    score += piece_scores[square[1]] + piece_position_score * .3
+                    score += 10 * piece_scores[square[1]] + 3 * piece_position_score
                 elif square[0] == "b":
-                    score -= piece_scores[square[1]] + piece_position_score * .3
-                
-            
-    return score
+                    score -= 10 * piece_scores[square[1]] + 3 * piece_position_score
+    return score / 10
 
 
 
@@ -181,118 +228,697 @@ def greedy_move(gs, valid_moves):
 
 
 '''
-minmax recursive algorithm
+searcher
+everything one search needs lives on the object: settings, transposition table, killers,
+history, node count and the result. each game or thread can have its own searcher, and
+nothing is printed, on_stats(stats) is handed a dict of statistics after every search instead.
+with a book (chess_book.opening_book) book positions are played from it without searching,
+with tablebases (chess_tablebase.tablebases) positions they cover are scored without searching.
+the module level functions further down keep working on default_searcher
 '''
+class searcher():
+    def __init__(self, depth = DEPTH, move_ordering = MOVE_ORDERING, delta_margin = DELTA_MARGIN,
+                 tt_size_mb = TT_SIZE_MB, eval_cache_size = EVAL_CACHE_SIZE, on_stats = None, book = None, tablebase = None):
+        self.depth = depth
+        self.move_ordering = move_ordering # hash move, MVV-LVA, killers and history before searching a node's moves
+        self.delta_margin = delta_margin # quiescence skips captures that can't get within this many pawns of alpha
+        self.on_stats = on_stats
+        self.book = book
+        self.tablebase = tablebase
+        self.transposition = transposition_table(tt_size_mb)
+        self.eval_cache = eval_cache(eval_cache_size) if eval_cache_size > 0 else None # separate from the search results
+        self.killer_moves = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        self.history_scores = {color + piece: [0] * 64 for color in "wb" for piece in "pRNBQK"}
+        self.stop_requested = False # set from another thread (or call stop) to end the search early, cleared as a search starts
+        self.nodes = 0
+        self.root_depth = depth
+        self.deadline = None
+        self.node_limit = None
+        self.start_time = 0.0
+        self.next_move = None # best root move of the search in progress
+        self.best_move = None # result of the last search
+        self.score = None # for the side to move
+        self.completed_depth = 0
+
+    # what a searcher needs to be built again with the same settings, eg. in another process
+    def settings(self):
+        return {"depth": self.depth, "move_ordering": self.move_ordering, "delta_margin": self.delta_margin,
+                "tt_size_mb": self.transposition.size_mb, "eval_cache_size": self.eval_cache.size if self.eval_cache is not None else 0}
+
+    def stop(self):
+        self.stop_requested = True
+
+    def start_search(self, time_limit = None, max_nodes = None):
+        self.nodes = 0
+        self.stop_requested = False
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + time_limit if time_limit is not None else None
+        self.node_limit = max_nodes
+        self.next_move = None
+        self.score = None
+        self.completed_depth = 0
+
+    def end_search(self, best_move):
+        self.best_move = best_move
+        if self.on_stats is not None:
+            self.on_stats(self.stats())
+        return best_move
+
+    def stats(self):
+        seconds = time.perf_counter() - self.start_time
+        return {"nodes": self.nodes, "seconds": seconds, "nps": int(self.nodes / seconds) if seconds > 0 else 0,
+                "depth": self.completed_depth, "score": self.score, "best_move": self.best_move,
+                "tt_hit_rate": self.transposition.hit_rate(),
+                "eval_hit_rate": self.eval_cache.hit_rate() if self.eval_cache is not None else None}
+
+    '''
+    minmax recursive algorithm
+    '''
+    # helper method to make first recursive call
+    def find_best_move_minmax(self, gs, valid_moves):
+        self.start_search()
+        random.shuffle(valid_moves)
+        self.root_depth = self.depth
+        self.minmax_move(gs, valid_moves, self.depth, gs.white_to_move)
+        self.completed_depth = self.depth
+        return self.end_search(self.next_move)
+
+    # actual algorithm
+    def minmax_move(self, gs, valid_moves, depth, white_to_move):
+        self.nodes += 1
+        if depth == 0:
+            return score_material(gs.board)
+
+        if white_to_move:
+            max_score = -CHECKMATE
+            for move in valid_moves:
+                gs.make_move(move)
+                next_moves = gs.get_valid_moves()
+                score = self.minmax_move(gs, next_moves, depth - 1, white_to_move= False)
+                if score > max_score:
+                    max_score = score
+                    if depth == self.root_depth:
+                        self.next_move = move
+                gs.undo_move()
+            return max_score
+        else:
+            min_score = CHECKMATE
+            for move in valid_moves:
+                gs.make_move(move)
+                next_moves = gs.get_valid_moves()
+                score = self.minmax_move(gs, next_moves, depth - 1, white_to_move= True)
+                if score < min_score:
+                    min_score = score
+                    if depth == self.root_depth:
+                        self.next_move = move
+                gs.undo_move()
+            return min_score
+
+    '''
+    negamax algorithm
+    '''
+    def find_best_move_negamax(self, gs, valid_moves):
+        self.start_search()
+        random.shuffle(valid_moves)
+        self.root_depth = self.depth
+        moves_made = len(gs.move_log)
+        try:
+            self.score = self.negamax_move(gs, valid_moves, self.depth, 1 if gs.white_to_move else -1)
+        except search_timeout:
+            while len(gs.move_log) > moves_made: # stopped, unwind and play the best root move searched so far
+                gs.undo_move()
+            return self.end_search(self.next_move)
+        self.completed_depth = self.depth
+        return self.end_search(self.next_move)
+
+    def negamax_move(self, gs, valid_moves, depth, turn_mult):
+        self.count_node()
+        if depth == 0:
+            return turn_mult*score_board(gs)
 
-# helper method to make first recursive call
-def find_best_move_minmax(gs, valid_moves):
-    global next_move
-    next_move = None
-    random.shuffle(valid_moves)
-    minmax_move(gs, valid_moves, DEPTH, gs.white_to_move)
-    return next_move
-
-# actual algorithm
-def minmax_move(gs,valid_moves, depth, white_to_move): 
-    global next_move 
-    if depth == 0:
-        return score_material(gs.board)
-    
-    if white_to_move:
         max_score = -CHECKMATE
         for move in valid_moves:
             gs.make_move(move)
             next_moves = gs.get_valid_moves()
-            score = minmax_move(gs, next_moves, depth - 1, white_to_move= False)
+            score = -self.negamax_move(gs, next_moves, depth - 1, -turn_mult)
             if score > max_score:
                 max_score = score
-                if depth == DEPTH:
-                    next_move = move
+                if depth == self.root_depth:
+                    self.next_move = move
             gs.undo_move()
         return max_score
-    else:
-        min_score = CHECKMATE
-        for move in valid_moves:
+
+    '''
+    alpha beta pruning
+    '''
+    # helper method
+    def find_best_move_negamax_aplhabeta(self, gs, valid_moves):
+        self.start_search()
+        # search deeper in the endgame, decided once here so every node sees the same depth
+        self.root_depth = self.depth + 2 if gs.turn_counter > 100 else self.depth
+        self.transposition.new_search()
+        self.new_search_ordering()
+        moves_made = len(gs.move_log)
+        try:
+            self.score = self.negamax_move_alphabeta(gs, valid_moves, self.root_depth, -CHECKMATE, CHECKMATE, 1 if gs.white_to_move else -1)
+        except search_timeout:
+            while len(gs.move_log) > moves_made: # stopped, unwind and play the best root move searched so far
+                gs.undo_move()
+            return self.end_search(self.next_move)
+        self.completed_depth = self.root_depth
+        return self.end_search(self.next_move)
+
+    # negamax with alphabeta
+    # below the root valid_moves is None and moves are generated in stages as they're needed
+    def negamax_move_alphabeta(self, gs, valid_moves, depth,  alpha, beta, turn_mult):
+        self.count_node()
+        if depth != self.root_depth:
+            # a position already on the game's or the search's path is a draw, nothing under it needs searching
+            if gs.is_repetition():
+                return DRAW
+            # so is the hundredth quiet ply, unless it's checkmate
+            if gs.halfmove_clock >= chess_engine.FIFTY_MOVE_PLIES:
+                if len(gs.get_valid_moves()) == 0: # sets checkmate or stalemate
+                    return turn_mult*score_board(gs)
+                return DRAW
+            # solved endings are looked up, not searched
+            score = self.tablebase_score(gs)
+            if score is not None:
+                return score
+        if valid_moves is not None and len(valid_moves) == 0: # checkmate or stalemate
+            return turn_mult*score_board(gs)
+        if depth == 0:
+            return self.quiescence(gs, alpha, beta, turn_mult)
+        # position seen before at least this deep, use what we know about it (not at the root, need a move there)
+        alpha_original = alpha
+        entry = self.transposition.probe(gs.zobrist_key)
+        if entry is not None and entry[1] >= depth and depth != self.root_depth:
+            score, flag = entry[2], entry[3]
+            if flag == EXACT:
+                return score
+            elif flag == LOWER_BOUND:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score
+        # move ordering - try to evaluate best moves first
+        ply = self.root_depth - depth
+        hash_move = entry[4] if entry is not None else None # moveID
+        if valid_moves is None:
+            moves = self.staged_moves(gs, hash_move, ply)
+        else:
+            moves = valid_moves
+            if self.move_ordering:
+                self.order_moves(moves, hash_move, ply)
+
+        max_score = -CHECKMATE
+        best_move = None
+        for move in moves:
             gs.make_move(move)
-            next_moves = gs.get_valid_moves()
-            score = minmax_move(gs, next_moves, depth - 1, white_to_move= True)
-            if score < min_score:
-                min_score = score
-                if depth == DEPTH:
-                    next_move = move
+            score = -self.negamax_move_alphabeta(gs, None, depth - 1,-beta,-alpha, -turn_mult)
+            if score > max_score:
+                max_score = score
+                best_move = move
+                if depth == self.root_depth:
+                    self.next_move = move
             gs.undo_move()
-        return min_score        
-    
+            if max_score > alpha: # pruning happens
+                alpha = max_score
+            if alpha >= beta:
+                if self.move_ordering and not move.is_capture and not move.is_enpassant_move:
+                    self.store_killer(move, ply, depth)
+                break
+        if best_move is None: # no legal moves, the last generator call left in_check for this position
+            if gs.in_check:
+                gs.checkmate = True
+            else:
+                gs.stalemate = True
+            return turn_mult*score_board(gs)
+        if max_score <= alpha_original:
+            flag = UPPER_BOUND
+        elif max_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transposition.store(gs.zobrist_key, depth, max_score, flag, best_move.moveID)
+        return max_score
+
+    '''
+    staged move generation for the search: captures are generated, ordered and searched first,
+    quiet moves are only generated if none of the captures caused a cutoff
+    '''
+    def staged_moves(self, gs, hash_move, ply):
+        captures = gs.get_valid_captures()
+        quiets = None
+        if self.move_ordering:
+            self.order_moves(captures, hash_move, ply)
+            if hash_move is not None and not (captures and captures[0].moveID == hash_move):
+                # the hash move is quiet, it still goes before the captures
+                quiets = gs.get_valid_quiets()
+                self.order_moves(quiets, hash_move, ply)
+                if quiets and quiets[0].moveID == hash_move:
+                    yield quiets.pop(0)
+        for move in captures:
+            yield move
+        if quiets is None:
+            quiets = gs.get_valid_quiets()
+            if self.move_ordering:
+                self.order_moves(quiets, hash_move, ply)
+        for move in quiets:
+            yield move
+
+    # score_board through the evaluation cache when there is one, checkmate and stalemate aren't cached
+    def evaluate(self, gs):
+        if self.eval_cache is None or gs.checkmate or gs.stalemate:
+            return score_board(gs)
+        return self.eval_cache.score(gs)
+
+    # every search counts nodes here, and stops when the time or node budget is used up
+    def count_node(self):
+        self.nodes += 1
+        if self.nodes & 63 == 0 and (self.stop_requested or (self.deadline is not None and time.perf_counter() > self.deadline) or \
+                                     (self.node_limit is not None and self.nodes >= self.node_limit)):
+            raise search_timeout()
+
+    '''
+    quiescence search
+    at the end of the main search keep playing out captures until the position is quiet, so a
+    score is never taken half way through an exchange. stand pat: the side to move can always
+    decline to capture, so the static score is a lower bound. delta pruning: skip captures
+    that can't bring the score back up to alpha even winning the piece outright
+    '''
+    def quiescence(self, gs, alpha, beta, turn_mult):
+        self.count_node()
+        score = self.tablebase_score(gs)
+        if score is not None:
+            return score
+        moves = gs.get_valid_captures()
+        in_check = gs.in_check # the generator overwrites it in the child nodes
+        if in_check: # can't stand pat in check, look at every way out of it
+            moves = gs.get_valid_moves()
+            if len(moves) == 0:
+                return turn_mult*score_board(gs)
+            stand_pat = -CHECKMATE
+        else:
+            stand_pat = turn_mult*self.evaluate(gs)
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat + piece_scores["Q"] + self.delta_margin < alpha: # even winning a queen won't help
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+        # MVV-LVA whether move_ordering is on or not, unsorted captures blow quiescence up on tactical positions
+        self.order_moves(moves, None, 0)
+        best_score = stand_pat
+        for move in moves:
+            if not in_check:
+                if move.is_pawn_promotion and move.promotion_piece != "Q": # underpromotions aren't worth it here
+                    continue
+                gain = piece_scores["p"] if move.is_enpassant_move else piece_scores.get(move.piece_captured[1], 0)
+                if move.is_pawn_promotion:
+                    gain += piece_scores["Q"] - piece_scores["p"]
+                if stand_pat + gain + self.delta_margin < alpha:
+                    continue
+            gs.make_move(move)
+            score = -self.quiescence(gs, -beta, -alpha, -turn_mult)
+            gs.undo_move()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    '''
+    iterative deepening
+    search depth 1, 2, 3... until the time or node budget runs out and return the best move
+    of the deepest search that finished. without a budget it stops at depth like the fixed depth search
+    score (for the side to move) and completed_depth are left describing that search.
+    on_iteration(depth, score, nodes, seconds, pv) is called after every finished depth
+    '''
+    def find_best_move_iterative(self, gs, valid_moves, time_limit = None, max_nodes = None, max_depth = None, on_iteration = None):
+        self.start_search(time_limit, max_nodes)
+        book_move = self.book_move(gs, valid_moves)
+        if book_move is not None:
+            return self.end_search(book_move)
+        if max_depth is None:
+            if time_limit is None and max_nodes is None:
+                max_depth = self.depth + 2 if gs.turn_counter > 100 else self.depth
+            else:
+                max_depth = MAX_DEPTH
+        self.transposition.new_search()
+        self.new_search_ordering()
+        moves = list(valid_moves)
+        # something to play even if depth 1 runs out of time: the hash move, else the best capture by MVV-LVA
+        entry = self.transposition.probe(gs.zobrist_key)
+        hash_move = entry[4] if entry is not None else None
+        best_move = max(moves, key = lambda move: move_order_score(move, hash_move, self.killer_moves[0], self.history_scores),
+                        default = None)
+        moves_made = len(gs.move_log)
+        turn_mult = 1 if gs.white_to_move else -1
+        for depth in range(1, max_depth + 1):
+            self.root_depth = depth
+            self.next_move = None
+            try:
+                score = self.negamax_move_alphabeta(gs, moves, depth, -CHECKMATE, CHECKMATE, turn_mult)
+            except search_timeout:
+                while len(gs.move_log) > moves_made: # unwind the search that got cut off
+                    gs.undo_move()
+                if self.next_move is not None: # the best of the root moves this iteration finished searching
+                    best_move = self.next_move
+                break
+            self.score = score
+            self.completed_depth = depth
+            if on_iteration is not None:
+                on_iteration(depth, score, self.nodes, time.perf_counter() - self.start_time, self.principal_variation(gs, depth))
+            if self.next_move is not None:
+                best_move = self.next_move
+                # the previous iteration's best move is searched first next time
+                moves.remove(best_move)
+                moves.insert(0, best_move)
+            if abs(score) >= CHECKMATE:
+                break # forced mate found, deeper won't change it
+            if self.tablebase_score(gs) is not None:
+                break # every root move was looked up, deeper won't change it
+        return self.end_search(best_move)
+
+    # weighted pick from the opening book, None when there's no book or the position isn't in it
+    def book_move(self, gs, valid_moves):
+        if self.book is None:
+            return None
+        return self.book.find_move(gs, valid_moves)
+
+    '''
+    the exact score for the side to move if the tablebases have the position, None otherwise.
+    a win is TABLEBASE_WIN less the plies to mate so the search heads for the quickest one,
+    a loss the negative so the losing side holds out longest
+    '''
+    def tablebase_score(self, gs):
+        if self.tablebase is None or gs.piece_count > self.tablebase.pieces:
+            return None
+        result = self.tablebase.probe(gs)
+        if result is None:
+            return None
+        wdl, dtm = result
+        if wdl == chess_tablebase.WDL_DRAW:
+            return 0
+        score = TABLEBASE_WIN - (dtm or 0)
+        return score if wdl == chess_tablebase.WDL_WIN else -score
+
+    # follow the best moves stored in the transposition table from this position
+    def principal_variation(self, gs, max_length):
+        pv = []
+        for _ in range(max_length):
+            entry = self.transposition.lookup(gs.zobrist_key)
+            if entry is None or entry[4] is None:
+                break
+            pv_move = None
+            for move in gs.get_valid_moves():
+                if move.moveID == entry[4]:
+                    pv_move = move
+                    break
+            if pv_move is None:
+                break
+            gs.make_move(pv_move)
+            pv.append(pv_move)
+        for _ in pv:
+            gs.undo_move()
+        return pv
+
+    '''
+    root parallel search
+    the root moves are ordered, then dealt out round robin to a multiprocessing pool. every worker
+    process builds a searcher with the same settings and runs the normal iterative deepening search
+    over its share, so with a depth or node limit the same position and worker count always give
+    the same move. the best score wins, a tie goes to the move that was ordered first.
+    nodes is summed over the workers, completed_depth is the shallowest any of them finished
+    '''
+    def find_best_move_parallel(self, gs, valid_moves, workers = None, time_limit = None, max_nodes = None, max_depth = None):
+        moves = list(valid_moves)
+        if self.book_move(gs, moves) is not None: # the normal search plays it
+            workers = 1
+        if workers is None:
+            workers = WORKERS
+        if workers <= 0:
+            workers = multiprocessing.cpu_count()
+        workers = min(workers, len(moves))
+        if workers <= 1:
+            return self.find_best_move_iterative(gs, moves, time_limit = time_limit, max_nodes = max_nodes, max_depth = max_depth)
+        self.start_search(time_limit, max_nodes)
+        entry = self.transposition.lookup(gs.zobrist_key)
+        self.order_moves(moves, entry[4] if entry is not None else None, 0)
+        move_order = [move.moveID for move in moves]
+        shares = [move_order[i::workers] for i in range(workers)]
+        if max_nodes is not None:
+            max_nodes = max(max_nodes // workers, 1)
+        with multiprocessing.Pool(workers) as pool:
+            tablebase_dir = self.tablebase.directory if self.tablebase is not None else None
+            results = pool.starmap(search_root_share, [(self.settings(), gs, share, time_limit, max_nodes, max_depth, tablebase_dir)
+                                                       for share in shares])
+        self.nodes = sum(result[3] for result in results)
+        finished = [result for result in results if result[1] is not None]
+        if not finished: # nobody got through depth 1, take the first ordered move
+            return self.end_search(moves[0])
+        best = max(finished, key = lambda result: (result[1], -move_order.index(result[0])))
+        self.score = best[1]
+        self.completed_depth = min(result[2] for result in finished)
+        return self.end_search(moves[move_order.index(best[0])])
+
+    '''
+    move ordering
+    alpha beta cuts off sooner when the best move is searched first, so every node sorts its moves:
+    1. the transposition table / previous iteration's best move
+    2. captures and promotions, most valuable victim first then least valuable attacker (MVV-LVA)
+    3. the two killer moves for this ply, quiet moves that caused a cutoff in a sibling node
+    4. the rest of the quiet moves by history score, how often that piece to that square caused cutoffs
+    '''
+    # killers only make sense within one search, history is kept but aged
+    def new_search_ordering(self):
+        for killers in self.killer_moves:
+            killers[0] = killers[1] = None
+        for scores in self.history_scores.values():
+            for sq in range(64):
+                scores[sq] //= 2
+
+    def clear_history(self):
+        for scores in self.history_scores.values():
+            scores[:] = [0] * 64
+
+    def order_moves(self, moves, hash_move, ply):
+        killers = self.killer_moves[ply]
+        history_scores = self.history_scores
+        moves.sort(key = lambda move: move_order_score(move, hash_move, killers, history_scores), reverse = True)
+
+    # a quiet move caused a beta cutoff, remember it for this ply and in the history table
+    def store_killer(self, move, ply, depth):
+        killers = self.killer_moves[ply]
+        if move.moveID != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+        self.history_scores[move.piece_moved][move.end_row*8 + move.end_col] += depth * depth
+
+
+class search_timeout(Exception):
+    pass
+
+# runs in a pool worker: search the root moves with these moveIDs, returns (best moveID, score, depth, nodes)
+# the tablebases are memory mapped so they're opened again in the worker from their directory
+def search_root_share(settings, gs, move_ids, time_limit, max_nodes, max_depth, tablebase_dir = None):
+    tablebase = chess_tablebase.tablebases(tablebase_dir) if tablebase_dir is not None else None
+    worker = searcher(tablebase = tablebase, **settings)
+    valid_moves = {move.moveID: move for move in gs.get_valid_moves()}
+    best_move = worker.find_best_move_iterative(gs, [valid_moves[move_id] for move_id in move_ids],
+                                                time_limit = time_limit, max_nodes = max_nodes, max_depth = max_depth)
+    return best_move.moveID, worker.score, worker.completed_depth, worker.nodes
+
+ordering_values = {"p":1, "N":3, "B":3, "R":5, "Q":9, "K":10}
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+KILLER_SCORE = 90000
+
+# hash_move and the killers are moveIDs
+def move_order_score(move, hash_move, killers, history_scores):
+    if move.moveID == hash_move:
+        return HASH_MOVE_SCORE
+    if move.is_capture or move.is_enpassant_move or move.is_pawn_promotion:
+        victim = "p" if move.is_enpassant_move else move.piece_captured[1]
+        score = CAPTURE_SCORE + 10 * ordering_values.get(victim, 0) - ordering_values[move.piece_moved[1]]
+        if move.is_pawn_promotion:
+            score += 10 * ordering_values[move.promotion_piece]
+        return score
+    if move.moveID == killers[0] or move.moveID == killers[1]:
+        return KILLER_SCORE
+    return history_scores[move.piece_moved][move.end_row*8 + move.end_col]
+
+'''
+search the same position to the same depth with move ordering off and on, each with a fresh
+searcher, and report the node counts so the pruning gain can be seen
 '''
-negamax algorithm
-'''              
+def compare_move_ordering(gs, depth = DEPTH):
+    results = {}
+    for ordering in (False, True):
+        compare = searcher(depth = depth, move_ordering = ordering)
+        start = time.perf_counter()
+        best = compare.find_best_move_negamax_aplhabeta(gs, gs.get_valid_moves())
+        results[ordering] = (compare.nodes, time.perf_counter() - start, best)
+    for ordering in (False, True):
+        nodes, seconds, best = results[ordering]
+        print("ordering " + ("on " if ordering else "off") + ": " + str(nodes) + " nodes, " +
+              str(round(seconds, 2)) + "s, best move " + str(best))
+    return results
 
-def find_best_move_negamax(gs, valid_moves):
-    global next_move, counter
-    next_move = None
-    random.shuffle(valid_moves)
-    counter = 0
-    negamax_move(gs, valid_moves, DEPTH, 1 if gs.white_to_move else -1)
-    print(counter)
-    return next_move
-
-  
-def negamax_move(gs, valid_moves, depth, turn_mult):
-    global next_move, counter
-    counter += 1
-    if depth == 0:
-        return turn_mult*score_board(gs)
-    
-    max_score = -CHECKMATE
-    for move in valid_moves:
-        gs.make_move(move)
-        next_moves = gs.get_valid_moves()
-        score = -negamax_move(gs, next_moves, depth - 1, -turn_mult)
-        if score > max_score:
-            max_score = score
-            if depth == DEPTH:
-                next_move = move
-        gs.undo_move()
-    return max_score
-                    
+
+'''
+transposition table
+fixed number of slots picked from a memory budget, a position goes in slot key & mask.
+each slot holds (key, depth, score, bound type, best moveID, age)
 '''
-alpha beta pruning
-'''    
+EXACT = 0
+LOWER_BOUND = 1 # score is at least this, search failed high
+UPPER_BOUND = 2 # score is at most this, search failed low
+
+class transposition_table():
+    ENTRY_BYTES = 160 # rough cost of one slot: list pointer, tuple and the ints in it
+
+    def __init__(self, size_mb = TT_SIZE_MB):
+        slots = 1
+        while slots * 2 * self.ENTRY_BYTES <= size_mb * 1024 * 1024:
+            slots *= 2
+        self.size = slots
+        self.size_mb = size_mb
+        self.mask = slots - 1
+        self.clear()
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0 # a different position was thrown out to make room
+
+    # call once per search, entries from older searches become first to go
+    def new_search(self):
+        self.age += 1
+
+    def probe(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    # same as probe but doesn't count towards the statistics
+    def lookup(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    # depth preferred, but anything left over from an older search can be replaced
+    def store(self, key, depth, score, flag, best_move):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is not None:
+            if entry[5] == self.age and depth < entry[1]: # keep the deeper result from this search
+                return
+            if entry[0] != key:
+                self.overwrites += 1
+        self.slots[index] = (key, depth, score, flag, best_move, self.age)
+        self.stores += 1
+
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
 
 
-# helper method
+'''
+evaluation cache
+score_board results by position, so a leaf reached again - in the same search or the next move's -
+isn't scored again. it only ever holds static scores, never search results, so its hit rate is
+the static evaluation reuse on its own. a fixed number of entries, the least recently used goes
+first. the key is the zobrist key plus whether the late game king term is on
+'''
+class eval_cache():
+    def __init__(self, size):
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def score(self, gs):
+        key = gs.zobrist_key << 1 | (gs.turn_counter > 70)
+        entries = self.entries
+        score = entries.get(key)
+        if score is not None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return score
+        self.misses += 1
+        score = score_board(gs)
+        entries[key] = score
+        if len(entries) > self.size:
+            entries.popitem(last = False)
+            self.evictions += 1
+        return score
+
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+
+'''
+module level search functions for the GUI and older scripts. they all run on default_searcher
+with the module settings above, then copy its result into next_move, counter, search_score
+and completed_depth. with VERBOSE on the node count is printed after every search
+'''
+def print_node_count(stats):
+    if VERBOSE:
+        print(stats["nodes"])
+
+default_searcher = searcher(on_stats = print_node_count)
+transposition = default_searcher.transposition
+next_move = None
+counter = 0
+search_score = None
+completed_depth = 0
+
+# the module settings can be changed between searches, eg. DEPTH
+def configured_searcher():
+    default_searcher.depth = DEPTH
+    default_searcher.move_ordering = MOVE_ORDERING
+    default_searcher.delta_margin = DELTA_MARGIN
+    return default_searcher
+
+def copy_results(best_move):
+    global next_move, counter, search_score, completed_depth
+    next_move = best_move
+    counter = default_searcher.nodes
+    search_score = default_searcher.score
+    completed_depth = default_searcher.completed_depth
+    return best_move
+
+def find_best_move_minmax(gs, valid_moves):
+    return copy_results(configured_searcher().find_best_move_minmax(gs, valid_moves))
+
+def find_best_move_negamax(gs, valid_moves):
+    return copy_results(configured_searcher().find_best_move_negamax(gs, valid_moves))
+
 def find_best_move_negamax_aplhabeta(gs, valid_moves):
-    global next_move, counter
-    next_move = None
-    counter = 0
-    negamax_move_alphabeta(gs, valid_moves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.white_to_move else -1)
-    print(counter)
-    return next_move
-
-# negamax with alphabeta
-def negamax_move_alphabeta(gs, valid_moves, depth,  alpha, beta, turn_mult):
-    global next_move, counter
-    counter += 1
-    if gs.turn_counter > 100:
-        depth = DEPTH + 2
-    if depth == 0:
-        return turn_mult*score_board(gs)
-    # move ordering - try to evaluate best moves first - implement later
-
-    max_score = -CHECKMATE
-    for move in valid_moves:
-        gs.make_move(move)
-        next_moves = gs.get_valid_moves()
-        score = -negamax_move_alphabeta(gs, next_moves, depth - 1,-beta,-alpha, -turn_mult)
-        if score > max_score:
-            max_score = score
-            if depth == DEPTH:
-                next_move = move
-        gs.undo_move()
-        if max_score > alpha: # pruning happens
-            alpha = max_score
-        if alpha >= beta:
-            break
-    return max_score
+    return copy_results(configured_searcher().find_best_move_negamax_aplhabeta(gs, valid_moves))
+
+def find_best_move_iterative(gs, valid_moves, time_limit = None, max_nodes = None, max_depth = None, on_iteration = None):
+    return copy_results(configured_searcher().find_best_move_iterative(gs, valid_moves, time_limit, max_nodes, max_depth, on_iteration))
+
+def find_best_move_parallel(gs, valid_moves, workers = None, time_limit = None, max_nodes = None, max_depth = None):
+    return copy_results(configured_searcher().find_best_move_parallel(gs, valid_moves, workers, time_limit, max_nodes, max_depth))
 
-                
\ No newline at end of file
+def principal_variation(gs, max_length):
+    return default_searcher.principal_variation(gs, max_length)
@@ -0,0 +1,118 @@
+'''
+Batch analysis - streams the positions of an EPD file through a pool of search processes and
+writes one JSON line per position. The file is read a line at a time and only a few positions
+per worker are ever waiting, so memory stays the same however big the file is. Results come
+out in the same order as the positions.
+
+python chess_batch.py positions.epd -o results.jsonl --depth 4 --workers 0
+python chess_batch.py positions.epd --time 0.5 > results.jsonl
+'''
+import argparse
+import collections
+import json
+import multiprocessing
+import sys
+import time
+import chess_ai, chess_headless
+
+PENDING_PER_WORKER = 4 # positions handed out ahead of the results being written
+worker_searcher = None # one searcher per pool process, built by init_worker
+
+
+# (line number, epd) for every position in the lines, blank lines and # comments are skipped
+def read_epd(lines):
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line
+
+def init_worker(settings):
+    global worker_searcher
+    worker_searcher = chess_ai.searcher(**settings)
+
+'''
+runs in a pool worker: search one position, every position starts with an empty transposition
+table and history so the results don't depend on which worker got which positions
+'''
+def analyse_epd(task):
+    number, epd, depth, time_limit, max_nodes = task
+    result = {"line": number}
+    gs = chess_headless.new_game_state()
+    try:
+        operations = gs.load_epd(epd)
+    except (ValueError, KeyError, IndexError) as error:
+        result["error"] = "bad EPD: " + str(error)
+        return result
+    if "id" in operations:
+        result["id"] = operations["id"].strip('"')
+    result["fen"] = gs.get_fen()
+    worker_searcher.transposition.clear()
+    worker_searcher.clear_history()
+    try:
+        result.update(chess_headless.search_position(gs, depth, time_limit, max_nodes, searcher = worker_searcher))
+    except Exception as error: # one position the search can't handle mustn't end the whole batch
+        result["error"] = "search failed: " + type(error).__name__ + ": " + str(error)
+        return result
+    for opcode in ("bm", "am"): # expected and avoid moves, in SAN as written
+        if opcode in operations:
+            result[opcode] = operations[opcode].split()
+    return result
+
+'''
+analyse every position in the lines and write the results to output as JSON lines,
+returns the number of positions. on_result(result) is called as each one is written
+'''
+def run_batch(lines, output, depth = None, time_limit = None, max_nodes = None, workers = 0, searcher_settings = None,
+              on_result = None):
+    if workers <= 0:
+        workers = multiprocessing.cpu_count()
+    if searcher_settings is None:
+        searcher_settings = {} # chess_ai's defaults
+    pending = collections.deque()
+    count = 0
+
+    def write_oldest():
+        result = pending.popleft().get()
+        output.write(json.dumps(result) + "\n")
+        if on_result is not None:
+            on_result(result)
+
+    with multiprocessing.Pool(workers, initializer = init_worker, initargs = (searcher_settings,)) as pool:
+        for number, epd in read_epd(lines):
+            pending.append(pool.apply_async(analyse_epd, ((number, epd, depth, time_limit, max_nodes),)))
+            count += 1
+            if len(pending) >= workers * PENDING_PER_WORKER:
+                write_oldest()
+        while pending:
+            write_oldest()
+    output.flush()
+    return count
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "search every position in an EPD file, results as JSON lines")
+    parser.add_argument("epd", help = "EPD file, - for stdin")
+    parser.add_argument("-o", "--output", default = None, help = "JSONL file to write, default stdout")
+    parser.add_argument("--depth", type = int, default = None)
+    parser.add_argument("--time", type = float, default = None, help = "seconds per position")
+    parser.add_argument("--nodes", type = int, default = None)
+    parser.add_argument("--workers", type = int, default = 0, help = "search processes, 0 for one per core")
+    parser.add_argument("--tt-size", type = int, default = 16, help = "transposition table MB per worker")
+    args = parser.parse_args(argv)
+
+    settings = {"tt_size_mb": args.tt_size}
+    epd_file = sys.stdin if args.epd == "-" else open(args.epd, encoding = "utf-8", errors = "replace")
+    output = sys.stdout if args.output is None else open(args.output, "w", encoding = "utf-8")
+    start = time.perf_counter()
+    count = run_batch(epd_file, output, args.depth, args.time, args.nodes, args.workers, settings)
+    seconds = time.perf_counter() - start
+    if output is not sys.stdout:
+        output.close()
+    if epd_file is not sys.stdin:
+        epd_file.close()
+    print(str(count) + " positions in " + str(round(seconds, 2)) + "s", file = sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
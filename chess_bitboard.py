@@ -0,0 +1,319 @@
+'''
+Bitboard representation of the chess position.
+Every piece type and color gets one 64 bit integer, bit (row*8 + col) is set when
+that piece is on square (row, col) so square numbering lines up with game_state.board.
+Same make_move/undo_move/get_valid_moves api as chess_engine.game_state,
+board is still kept as an 8x8 view so drawing and move objects keep working
+'''
+import chess_engine
+
+PIECES = ("wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK")
+FULL = (1 << 64) - 1
+
+# (row step, col step) for every sliding direction
+# positive directions walk to higher square numbers, so the first blocker is the lowest set bit
+ROOK_DIRECTIONS = ((1,0),(0,1),(-1,0),(0,-1))
+BISHOP_DIRECTIONS = ((1,1),(1,-1),(-1,-1),(-1,1))
+POSITIVE_DIRECTIONS = ((1,0),(0,1),(1,1),(1,-1))
+
+
+'''
+precomputed attack tables, built once on import
+'''
+def _on_board(r, c):
+    return 0 <= r < 8 and 0 <= c < 8
+
+def _step_table(steps):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        for dr, dc in steps:
+            if _on_board(r + dr, c + dc):
+                bb |= 1 << ((r + dr)*8 + c + dc)
+        table.append(bb)
+    return table
+
+def _ray_table(d):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        r, c = r + d[0], c + d[1]
+        while _on_board(r, c):
+            bb |= 1 << (r*8 + c)
+            r, c = r + d[0], c + d[1]
+        table.append(bb)
+    return table
+
+KNIGHT_ATTACKS = _step_table(((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)))
+KING_ATTACKS = _step_table(((1,1),(-1,1),(-1,-1),(1,-1),(0,1),(1,0),(0,-1),(-1,0)))
+# squares a pawn of that color attacks from a square
+PAWN_ATTACKS = {"w": _step_table(((-1,-1),(-1,1))), "b": _step_table(((1,-1),(1,1)))}
+RAYS = {d: _ray_table(d) for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+
+# squares strictly between two squares on the same line, 0 if they aren't on a line
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+    for _sq in range(64):
+        _bb = 0
+        _r, _c = divmod(_sq, 8)
+        _r, _c = _r + _d[0], _c + _d[1]
+        while _on_board(_r, _c):
+            BETWEEN[_sq][_r*8 + _c] = _bb
+            _bb |= 1 << (_r*8 + _c)
+            _r, _c = _r + _d[0], _c + _d[1]
+
+
+def _slider_attacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if d in POSITIVE_DIRECTIONS:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+def rook_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+def bishop_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+# yields the square number of every set bit, lowest first
+def squares(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+class bitboard_state(chess_engine.game_state):
+    def __init__(self):
+        super().__init__()
+        self.build_bitboards()
+
+    # bitboards from the 8x8 board, after that make_move and undo_move keep them in step
+    def build_bitboards(self):
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.occupancy = {"w": 0, "b": 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.bitboards[piece] |= 1 << (r*8 + c)
+                    self.occupancy[piece[0]] |= 1 << (r*8 + c)
+
+    def load_fen(self, fen):
+        super().load_fen(fen)
+        self.build_bitboards()
+
+    '''
+    flips every bit a move touches, xor makes this its own inverse so
+    make_move and undo_move share it. promoted_piece is whatever ends up on the end square
+    '''
+    def toggle_move(self, move, promoted_piece):
+        bbs = self.bitboards
+        color = move.piece_moved[0]
+        start_bit = 1 << (move.start_row*8 + move.start_col)
+        end_bit = 1 << (move.end_row*8 + move.end_col)
+        bbs[move.piece_moved] ^= start_bit
+        bbs[promoted_piece] ^= end_bit
+        self.occupancy[color] ^= start_bit | end_bit
+        if move.piece_captured != "--":
+            if move.is_enpassant_move:
+                capture_bit = 1 << (move.start_row*8 + move.end_col)
+            else:
+                capture_bit = end_bit
+            bbs[move.piece_captured] ^= capture_bit
+            self.occupancy[move.piece_captured[0]] ^= capture_bit
+        if move.is_castle_move:
+            row = move.end_row*8
+            if move.end_col - move.start_col == 2: # kingside
+                rook_bits = (1 << (row + 7)) | (1 << (row + 5))
+            else:
+                rook_bits = (1 << row) | (1 << (row + 3))
+            bbs[color + "R"] ^= rook_bits
+            self.occupancy[color] ^= rook_bits
+
+    def make_move(self, move):
+        super().make_move(move)
+        self.toggle_move(move, self.board[move.end_row][move.end_col])
+
+    def undo_move(self):
+        if len(self.move_log) != 0:
+            move = self.move_log[-1]
+            # before the board is put back, the end square still has the piece that landed there (the promoted one)
+            self.toggle_move(move, self.board[move.end_row][move.end_col])
+            super().undo_move()
+
+    '''
+    bitboard of the pieces of color attacking square sq, given an occupancy
+    '''
+    def attackers_to(self, sq, color, occupied):
+        bbs = self.bitboards
+        enemy = "b" if color == "w" else "w"
+        queens = bbs[color + "Q"]
+        return (KNIGHT_ATTACKS[sq] & bbs[color + "N"]) | \
+            (KING_ATTACKS[sq] & bbs[color + "K"]) | \
+            (PAWN_ATTACKS[enemy][sq] & bbs[color + "p"]) | \
+            (bishop_attacks(sq, occupied) & (bbs[color + "B"] | queens)) | \
+            (rook_attacks(sq, occupied) & (bbs[color + "R"] | queens))
+
+    def square_under_attack(self, r, c):
+        enemy = "b" if self.white_to_move else "w"
+        occupied = self.occupancy["w"] | self.occupancy["b"]
+        return self.attackers_to(r*8 + c, enemy, occupied) != 0
+
+    '''
+    all legal moves, captures first
+    '''
+    def get_valid_moves(self):
+        moves = self.get_legal_moves(True, True)
+        if len(moves) == 0:
+            if self.in_check:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        return moves
+
+    # captures and promotions only, quiet targets are masked out before any move is built
+    def get_valid_captures(self):
+        return self.get_legal_moves(True, False)
+
+    # everything get_valid_captures leaves out, for the quiet stage of searcher.staged_moves
+    def get_valid_quiets(self):
+        return self.get_legal_moves(False, True)
+
+    def get_legal_moves(self, include_captures, include_quiets):
+        ally = "w" if self.white_to_move else "b"
+        enemy = "b" if self.white_to_move else "w"
+        bbs = self.bitboards
+        board = self.board
+        own = self.occupancy[ally]
+        their = self.occupancy[enemy]
+        occupied = own | their
+        king_sq = bbs[ally + "K"].bit_length() - 1
+        checkers = self.attackers_to(king_sq, enemy, occupied)
+        self.in_check = checkers != 0
+        captures = []
+        quiets = []
+        # squares a non pawn move may land on
+        landing = 0
+        if include_captures:
+            landing |= their
+        if include_quiets:
+            landing |= ~occupied
+
+        # king steps, looked at with the king lifted off the board so it can't hide behind itself
+        king_r, king_c = divmod(king_sq, 8)
+        no_king = occupied ^ (1 << king_sq)
+        for to in squares(KING_ATTACKS[king_sq] & landing):
+            if not self.attackers_to(to, enemy, no_king):
+                if board[to >> 3][to & 7] != "--":
+                    captures.append(chess_engine.move((king_r, king_c), (to >> 3, to & 7), board))
+                else:
+                    quiets.append(chess_engine.move((king_r, king_c), (to >> 3, to & 7), board))
+
+        if checkers & (checkers - 1) == 0: # not double check, other pieces can move
+            if checkers:
+                checker_sq = checkers.bit_length() - 1
+                target_mask = checkers | BETWEEN[king_sq][checker_sq]
+            else:
+                target_mask = FULL
+                if include_quiets:
+                    self.castle_bitboard_moves(king_r, king_c, occupied, enemy, quiets)
+
+            # pinned pieces can only move along the line between the king and the pinner
+            pin_masks = {}
+            snipers = (rook_attacks(king_sq, their) & (bbs[enemy + "R"] | bbs[enemy + "Q"])) | \
+                (bishop_attacks(king_sq, their) & (bbs[enemy + "B"] | bbs[enemy + "Q"]))
+            for sniper in squares(snipers):
+                blockers = BETWEEN[king_sq][sniper] & occupied
+                if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+                    pin_masks[blockers.bit_length() - 1] = BETWEEN[king_sq][sniper] | (1 << sniper)
+
+            targets = landing & target_mask
+            for piece, attack in (("N", None), ("B", bishop_attacks), ("R", rook_attacks), ("Q", None)):
+                for frm in squares(bbs[ally + piece]):
+                    if piece == "N":
+                        attacked = KNIGHT_ATTACKS[frm]
+                    elif piece == "Q":
+                        attacked = rook_attacks(frm, occupied) | bishop_attacks(frm, occupied)
+                    else:
+                        attacked = attack(frm, occupied)
+                    attacked &= targets
+                    if frm in pin_masks:
+                        attacked &= pin_masks[frm]
+                    start = (frm >> 3, frm & 7)
+                    for to in squares(attacked & their):
+                        captures.append(chess_engine.move(start, (to >> 3, to & 7), board))
+                    for to in squares(attacked & ~their):
+                        quiets.append(chess_engine.move(start, (to >> 3, to & 7), board))
+            self.pawn_bitboard_moves(ally, enemy, king_sq, occupied, their, target_mask, pin_masks, include_captures, include_quiets, captures, quiets)
+        return captures + quiets
+
+    def pawn_bitboard_moves(self, ally, enemy, king_sq, occupied, their, target_mask, pin_masks, include_captures, include_quiets, captures, quiets):
+        board = self.board
+        forward = -8 if ally == "w" else 8
+        start_row = 6 if ally == "w" else 1
+        promotion_row = 0 if ally == "w" else 7
+        if self.enpassant_possible != ():
+            enpassant_sq = self.enpassant_possible[0]*8 + self.enpassant_possible[1]
+        else:
+            enpassant_sq = -1
+        for frm in squares(self.bitboards[ally + "p"]):
+            allowed = target_mask & pin_masks.get(frm, FULL)
+            start = (frm >> 3, frm & 7)
+            to = frm + forward
+            if not (occupied >> to) & 1:
+                if (allowed >> to) & 1:
+                    if to >> 3 == promotion_row: # promotions are searched with the captures
+                        if include_captures:
+                            for piece in ("Q","R","B","N"):
+                                captures.append(chess_engine.move(start, (to >> 3, to & 7), board, promotion_piece = piece))
+                    elif include_quiets:
+                        quiets.append(chess_engine.move(start, (to >> 3, to & 7), board))
+                two = to + forward
+                if frm >> 3 == start_row and include_quiets and not (occupied >> two) & 1 and (allowed >> two) & 1:
+                    quiets.append(chess_engine.move(start, (two >> 3, two & 7), board))
+            if not include_captures:
+                continue
+            attacks = PAWN_ATTACKS[ally][frm]
+            for to in squares(attacks & their & allowed):
+                if to >> 3 == promotion_row:
+                    for piece in ("Q","R","B","N"):
+                        captures.append(chess_engine.move(start, (to >> 3, to & 7), board, promotion_piece = piece))
+                else:
+                    captures.append(chess_engine.move(start, (to >> 3, to & 7), board))
+            if enpassant_sq != -1 and (attacks >> enpassant_sq) & 1:
+                # rare enough to just play it out on the occupancy and look for attacks on the king
+                captured_sq = enpassant_sq - forward
+                after = (occupied ^ (1 << frm) ^ (1 << captured_sq)) | (1 << enpassant_sq)
+                bbs = self.bitboards
+                queens = bbs[enemy + "Q"]
+                exposed = (rook_attacks(king_sq, after) & (bbs[enemy + "R"] | queens)) | \
+                    (bishop_attacks(king_sq, after) & (bbs[enemy + "B"] | queens)) | \
+                    (KNIGHT_ATTACKS[king_sq] & bbs[enemy + "N"]) | \
+                    (PAWN_ATTACKS[ally][king_sq] & bbs[enemy + "p"] & ~(1 << captured_sq))
+                if not exposed:
+                    captures.append(chess_engine.move(start, (enpassant_sq >> 3, enpassant_sq & 7), board, enpassant_move = True))
+
+    def castle_bitboard_moves(self, r, c, occupied, enemy, moves):
+        rights = self.castling_rights
+        if self.white_to_move:
+            kingside, queenside = rights & chess_engine.WHITE_KINGSIDE, rights & chess_engine.WHITE_QUEENSIDE
+        else:
+            kingside, queenside = rights & chess_engine.BLACK_KINGSIDE, rights & chess_engine.BLACK_QUEENSIDE
+        row = r*8
+        if kingside and not occupied & ((1 << (row + 5)) | (1 << (row + 6))):
+            if not self.attackers_to(row + 5, enemy, occupied) and not self.attackers_to(row + 6, enemy, occupied):
+                moves.append(chess_engine.move((r,c), (r,c+2), self.board, castle_move = True))
+        if queenside and not occupied & ((1 << (row + 1)) | (1 << (row + 2)) | (1 << (row + 3))):
+            if not self.attackers_to(row + 3, enemy, occupied) and not self.attackers_to(row + 2, enemy, occupied):
+                moves.append(chess_engine.move((r,c), (r,c-2), self.board, castle_move = True))
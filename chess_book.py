@@ -0,0 +1,164 @@
+'''
+Opening book - a file of (zobrist key, moveID, weight) entries sorted by key.
+It's memory mapped rather than read, so opening it costs nothing, and a lookup is a binary
+search over the mapped bytes: a few microseconds and no search at all for book positions.
+The keys are chess_engine's zobrist keys, so a book only works with the tables it was built with.
+
+python chess_book.py build games.pgn more.pgn -o book.bin --max-ply 20
+python chess_book.py probe --fen "<fen>" --book book.bin
+'''
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import chess_pgn
+
+MAGIC = b"CSBOOK1\0"
+ENTRY = struct.Struct(">QHH") # key, moveID, weight - 12 bytes
+KEY = struct.Struct(">Q")
+MAX_WEIGHT = 0xFFFF
+DEFAULT_BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+
+
+class opening_book():
+    def __init__(self, path = DEFAULT_BOOK):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(MAGIC):
+            self.file.close()
+            raise ValueError("not an opening book: " + path)
+        self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("not an opening book: " + path)
+        self.count = (size - len(MAGIC)) // ENTRY.size
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    # index of the first entry with this key or a bigger one
+    def first_index(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.data, len(MAGIC) + middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # [(moveID, weight), ...] for the position with this zobrist key
+    def entries(self, key):
+        entries = []
+        i = self.first_index(key)
+        while i < self.count:
+            entry_key, move_id, weight = ENTRY.unpack_from(self.data, len(MAGIC) + i * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((move_id, weight))
+            i += 1
+        return entries
+
+    '''
+    a book move for the position picked at random in proportion to its weight, or None if the
+    position isn't in the book. only moves in valid_moves are played, so a hash collision
+    can't produce an illegal move
+    '''
+    def find_move(self, gs, valid_moves, rng = random):
+        legal = {move.moveID: move for move in valid_moves}
+        entries = [(move_id, weight) for move_id, weight in self.entries(gs.zobrist_key) if move_id in legal and weight > 0]
+        if not entries:
+            return None
+        pick = rng.uniform(0, sum(weight for move_id, weight in entries))
+        for move_id, weight in entries:
+            pick -= weight
+            if pick <= 0:
+                return legal[move_id]
+        return legal[entries[-1][0]]
+
+# the default book if someone has built one, None otherwise
+def open_default_book():
+    if os.path.exists(DEFAULT_BOOK):
+        return opening_book(DEFAULT_BOOK)
+    return None
+
+
+'''
+count the moves played from every position in the first max_ply plies of the games, a win
+for the side that played the move counts 2, a draw 1 and a loss 0. positions need min_games
+games to be kept. returns {zobrist key: {moveID: weight}}
+'''
+def collect_book_moves(pgn_paths, max_ply = 20, min_games = 1):
+    positions = {}
+    games = {}
+    for path in pgn_paths:
+        with open(path, encoding = "utf-8", errors = "replace") as pgn_file:
+            for headers, moves in chess_pgn.read_games(pgn_file):
+                result = headers.get("Result", "*")
+                try:
+                    gs = chess_pgn.new_game_state(headers.get("FEN"))
+                    for san in moves[:max_ply]:
+                        move = chess_pgn.move_from_san(gs, san)
+                        if result == "1/2-1/2":
+                            weight = 1
+                        elif result == ("1-0" if gs.white_to_move else "0-1"):
+                            weight = 2
+                        else:
+                            weight = 0
+                        book_moves = positions.setdefault(gs.zobrist_key, {})
+                        book_moves[move.moveID] = book_moves.get(move.moveID, 0) + weight
+                        games[gs.zobrist_key] = games.get(gs.zobrist_key, 0) + 1
+                        gs.make_move(move)
+                except ValueError: # bad move in the game, keep what was read up to it
+                    pass
+    return {key: book_moves for key, book_moves in positions.items() if games[key] >= min_games}
+
+# write the sorted book file, returns the number of entries
+def write_book(positions, path):
+    entries = []
+    for key, book_moves in positions.items():
+        for move_id, weight in book_moves.items():
+            entries.append((key, move_id, weight))
+    largest = max((weight for key, move_id, weight in entries), default = 0)
+    scale = MAX_WEIGHT / largest if largest > MAX_WEIGHT else 1 # keep weights in 16 bits
+    entries.sort()
+    with open(path, "wb") as book_file:
+        book_file.write(MAGIC)
+        for key, move_id, weight in entries:
+            book_file.write(ENTRY.pack(key, move_id, int(weight * scale)))
+    return len(entries)
+
+def build_book(pgn_paths, path = DEFAULT_BOOK, max_ply = 20, min_games = 1):
+    return write_book(collect_book_moves(pgn_paths, max_ply, min_games), path)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "build or look up an opening book")
+    parser.add_argument("command", choices = ("build", "probe"))
+    parser.add_argument("pgn", nargs = "*", help = "PGN files to build from")
+    parser.add_argument("-o", "--book", default = DEFAULT_BOOK)
+    parser.add_argument("--max-ply", type = int, default = 20, help = "only book this many plies into each game")
+    parser.add_argument("--min-games", type = int, default = 1, help = "positions seen in fewer games are left out")
+    parser.add_argument("--fen", default = None)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        entries = build_book(args.pgn, args.book, args.max_ply, args.min_games)
+        print(str(entries) + " entries written to " + args.book)
+        return 0
+    book = opening_book(args.book)
+    gs = chess_pgn.new_game_state(args.fen)
+    legal = {move.moveID: move for move in gs.get_valid_moves()}
+    for move_id, weight in sorted(book.entries(gs.zobrist_key), key = lambda entry: entry[1], reverse = True):
+        if move_id in legal:
+            print(legal[move_id].get_chess_notation() + " " + str(weight))
+    book.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
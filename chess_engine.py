@@ -3,6 +3,80 @@ Storing all information about the current state of chess game.
 Determining valid moves at the current state.
 Keep a move log
 '''
+import random
+
+'''
+zobrist hashing, one random 64 bit number per piece per square, side to move,
+castling rights and en passant file. fixed seed so a position always gets the same key
+'''
+zobrist_random = random.Random(20210101)
+ZOBRIST_PIECES = {color + piece: [zobrist_random.getrandbits(64) for _ in range(64)]
+                  for color in "wb" for piece in "pRNBQK"}
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [zobrist_random.getrandbits(64) for _ in range(16)] # indexed by the castling rights int
+ZOBRIST_ENPASSANT = [zobrist_random.getrandbits(64) for _ in range(8)] # indexed by file
+
+'''
+castling rights are packed into one int, a bit per right
+'''
+WHITE_KINGSIDE = 1
+BLACK_KINGSIDE = 2
+WHITE_QUEENSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+# rights left after anything moves from or to a square (row*8 + col), a king or rook leaving
+# its starting square or a rook being captured there loses the rights that depend on it
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[0] = ALL_CASTLING & ~BLACK_QUEENSIDE
+CASTLING_MASKS[4] = ALL_CASTLING & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[7] = ALL_CASTLING & ~BLACK_KINGSIDE
+CASTLING_MASKS[56] = ALL_CASTLING & ~WHITE_QUEENSIDE
+CASTLING_MASKS[60] = ALL_CASTLING & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[63] = ALL_CASTLING & ~WHITE_KINGSIDE
+# the pieces castling needs on their starting squares, a FEN right without them is dropped
+CASTLING_PIECES = ((60, "wK"), (63, "wR"), (56, "wR"), (4, "bK"), (7, "bR"), (0, "bR"))
+
+'''
+move tables for every square (row*8 + col), worked out once so move generation and the attack
+map just loop over squares that are on the board. RAY_SQUARES[sq][j] walks out from sq in DIRECTIONS[j]
+'''
+DIRECTIONS = ((-1,0),(0,-1),(1,0),(0,1),(-1,-1),(-1,1),(1,-1),(1,1)) # 4 straight then 4 diagonal
+KNIGHT_OFFSETS = ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1))
+
+def offset_squares(r, c, offsets):
+    return tuple((r + dr, c + dc) for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+
+def ray_squares(r, c, d):
+    return tuple((r + d[0]*i, c + d[1]*i) for i in range(1,8) if 0 <= r + d[0]*i < 8 and 0 <= c + d[1]*i < 8)
+
+KNIGHT_SQUARES = [offset_squares(sq >> 3, sq & 7, KNIGHT_OFFSETS) for sq in range(64)]
+KING_SQUARES = [offset_squares(sq >> 3, sq & 7, DIRECTIONS) for sq in range(64)]
+RAY_SQUARES = [tuple(ray_squares(sq >> 3, sq & 7, d) for d in DIRECTIONS) for sq in range(64)]
+# squares a pawn of each color attacks, white pawns capture up the board (towards row 0)
+PAWN_ATTACK_SQUARES = {"w": [offset_squares(sq >> 3, sq & 7, ((-1,-1),(-1,1))) for sq in range(64)],
+                       "b": [offset_squares(sq >> 3, sq & 7, ((1,-1),(1,1))) for sq in range(64)]}
+SLIDER_DIRECTIONS = {"R": range(0,4), "B": range(4,8), "Q": range(0,8)}
+FIFTY_MOVE_PLIES = 100 # halfmove_clock at which the game is drawn
+
+# 'bm Nf3 Nc3; id "pos; 1";' -> {"bm": "Nf3 Nc3", "id": '"pos; 1"'}, semicolons inside quotes don't count
+def parse_epd_operations(text):
+    operations = {}
+    current = ""
+    quoted = False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        if char == ";" and not quoted:
+            if current.strip():
+                opcode, _, operand = current.strip().partition(" ")
+                operations[opcode] = operand.strip()
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        opcode, _, operand = current.strip().partition(" ")
+        operations[opcode] = operand.strip()
+    return operations
 
 
 class game_state():
@@ -26,32 +100,218 @@ class game_state():
         self.white_to_move = True
         self.move_log = []
         self.turn_counter = 0
+        self.halfmove_clock = 0 # plies since the last capture or pawn move, for the fifty move rule
+        self.fullmove_number = 1 # goes up after every black move, like in FEN
+        self.piece_count = 32 # kings included, for the tablebases
         self.white_king_location = (7,4)
         self.black_king_location = (0,4)
         self.in_check = False
         self.pins = []
         self.checks = []
+        self.attacked = None # enemy_attack_map() of the position get_legal_moves last looked at
+        self.attack_map_key = None # zobrist key of that position
         self.checkmate = False
         self.stalemate = False
+        # which moves the piece generators build, get_valid_captures and get_valid_quiets narrow it down
+        self.include_captures = True # captures, en passant and promotions
+        self.include_quiets = True # everything else
         self.enpassant_possible = () # coordinates for square where en passant is possible
-        self.enpassant_possible_log = [self.enpassant_possible]
-        self.current_castling_rights = castle_rights(True,True,True,True)
-        self.castle_rights_log = [castle_rights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                                self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.castling_rights = ALL_CASTLING
+        self.zobrist_key = self.compute_zobrist_key()
+        self.zobrist_log = [self.zobrist_key] # key history, zobrist_log[-1] is always the current key
+        # running evaluation total, only kept once an evaluator hands over its piece square values
+        self.piece_square_values = None
+        self.eval_score = 0
+        self.eval_score_ply = 0 # eval_score is only kept from this many moves into move_log
+        # (enpassant_possible, castling_rights, eval_score, halfmove_clock) from before each move in move_log
+        self.state_log = []
         
         
         
         
         
+    '''
+    set up a position from a FEN string, eg. the start position is
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    the move log starts again from this position. the move counters are optional.
+    castling rights whose king or rook isn't on its starting square are dropped
+    '''
+    def load_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError("FEN needs at least piece placement and side to move: " + fen)
+        if fields[1] not in ("w", "b"):
+            raise ValueError("FEN side to move isn't w or b: " + fen)
+        castling = fields[2] if len(fields) > 2 else "-"
+        if castling != "-" and (castling.strip("KQkq") != "" or len(set(castling)) != len(castling)):
+            raise ValueError("FEN castling rights aren't - or some of KQkq: " + fen)
+        enpassant = fields[3] if len(fields) > 3 else "-"
+        try:
+            halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("FEN move counters aren't numbers: " + fen)
+        board = []
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char.upper() in "PRNBQK":
+                    row.append(("w" if char.isupper() else "b") + ("p" if char.upper() == "P" else char.upper()))
+                else:
+                    raise ValueError("unknown piece '" + char + "' in FEN: " + fen)
+            if len(row) != 8:
+                raise ValueError("FEN rank doesn't have 8 squares: " + rank)
+            board.append(row)
+        if len(board) != 8:
+            raise ValueError("FEN doesn't have 8 ranks: " + fen)
+        squares = [square for row in board for square in row]
+        if squares.count("wK") != 1 or squares.count("bK") != 1:
+            raise ValueError("FEN needs exactly one king for each side: " + fen)
+        if any(square[1] == "p" for square in board[0] + board[7]):
+            raise ValueError("FEN has a pawn on the first or last rank: " + fen)
+        if enpassant != "-":
+            # the square a pawn of the side that just moved skipped over, with that pawn in front of it
+            if len(enpassant) != 2 or enpassant[0] not in move.files_to_cols or enpassant[1] != ("6" if fields[1] == "w" else "3"):
+                raise ValueError("FEN en passant square isn't on the right rank for the side to move: " + fen)
+            col = move.files_to_cols[enpassant[0]]
+            pawn_row, pawn = (3, "bp") if fields[1] == "w" else (4, "wp")
+            if board[pawn_row][col] != pawn or board[move.ranks_to_rows[enpassant[1]]][col] != "--":
+                raise ValueError("FEN en passant square has no pawn that just moved past it: " + fen)
+        self.board = board
+        self.piece_count = sum(1 for row in board for square in row if square != "--")
+        for r in range(8):
+            for c in range(8):
+                if board[r][c] == "wK":
+                    self.white_king_location = (r,c)
+                elif board[r][c] == "bK":
+                    self.black_king_location = (r,c)
+        self.white_to_move = fields[1] == "w"
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = max(fullmove_number, 1)
+        self.move_log = []
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        self.checkmate = False
+        self.stalemate = False
+        if enpassant != "-":
+            self.enpassant_possible = (move.ranks_to_rows[enpassant[1]], move.files_to_cols[enpassant[0]])
+        else:
+            self.enpassant_possible = ()
+        self.castling_rights = 0
+        for char, right in (("K", WHITE_KINGSIDE), ("k", BLACK_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("q", BLACK_QUEENSIDE)):
+            if char in castling:
+                self.castling_rights |= right
+        for sq, piece in CASTLING_PIECES:
+            if squares[sq] != piece:
+                self.castling_rights &= CASTLING_MASKS[sq]
+        self.state_log = []
+        self.zobrist_key = self.compute_zobrist_key()
+        self.zobrist_log = [self.zobrist_key]
+        if self.piece_square_values is not None:
+            self.set_piece_square_values(self.piece_square_values)
+
+    # the position as a FEN string, load_fen(get_fen()) gives the same position back
+    def get_fen(self):
+        return self.get_epd() + " " + str(self.halfmove_clock) + " " + str(self.fullmove_number)
+
+    '''
+    set up a position from an EPD line: the first four FEN fields then operations like
+    bm Nf3; id "test 1"; - returns the operations as {opcode: operand string}.
+    hmvc and fmvn set the move counters
+    '''
+    def load_epd(self, epd):
+        fields = epd.split(None, 4)
+        if len(fields) < 4:
+            raise ValueError("EPD needs piece placement, side to move, castling and en passant: " + epd)
+        operations = parse_epd_operations(fields[4] if len(fields) > 4 else "")
+        self.load_fen(" ".join(fields[:4]) + " " + operations.get("hmvc", "0") + " " + operations.get("fmvn", "1"))
+        return operations
+
+    # the first four FEN fields followed by the operations in {opcode: operand string}
+    def get_epd(self, operations = None):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                char = "P" if square[1] == "p" else square[1]
+                rank += char if square[0] == "w" else char.lower()
+            ranks.append(rank + (str(empty) if empty else ""))
+        castling = "".join(char for char, right in (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("k", BLACK_KINGSIDE),
+                                                    ("q", BLACK_QUEENSIDE)) if self.castling_rights & right)
+        if self.enpassant_possible != ():
+            enpassant = move.cols_to_files[self.enpassant_possible[1]] + move.rows_to_ranks[self.enpassant_possible[0]]
+        else:
+            enpassant = "-"
+        epd = "/".join(ranks) + " " + ("w" if self.white_to_move else "b") + " " + (castling or "-") + " " + enpassant
+        for opcode, operand in (operations or {}).items():
+            epd += " " + opcode + (" " + operand if operand else "") + ";"
+        return epd
+
+    '''
+    draw detection off zobrist_log and halfmove_clock. a position can only come back within
+    halfmove_clock plies (captures and pawn moves can't be undone) and with the same side to
+    move, so only every other key in that window is looked at
+    '''
+    # has the position been seen before, the search treats even one repeat as a draw
+    def is_repetition(self):
+        log = self.zobrist_log
+        last = len(log) - 1
+        for i in range(last - 4, max(last - self.halfmove_clock, 0) - 1, -2):
+            if log[i] == self.zobrist_key:
+                return True
+        return False
+
+    # times the position has occurred, this time included
+    def repetition_count(self):
+        log = self.zobrist_log
+        last = len(log) - 1
+        count = 1
+        for i in range(last - 4, max(last - self.halfmove_clock, 0) - 1, -2):
+            if log[i] == self.zobrist_key:
+                count += 1
+        return count
+
+    # kings alone, or with one knight or bishop, can't mate
+    def is_insufficient_material(self):
+        if self.piece_count > 3:
+            return False
+        return all(square == "--" or square[1] in "KNB" for row in self.board for square in row)
+
+    '''
+    why the game is drawn by rule - "repetition" (threefold), "fifty moves" or
+    "insufficient material" - or None. checkmate and stalemate are up to the move generator
+    '''
+    def draw_reason(self):
+        if self.repetition_count() >= 3:
+            return "repetition"
+        if self.halfmove_clock >= FIFTY_MOVE_PLIES:
+            return "fifty moves"
+        if self.is_insufficient_material():
+            return "insufficient material"
+        return None
+
         '''
         takes a move as a parameter and executes it
         Will not work for castling, en passant, pawn promotion
         '''   
     def make_move(self, move):
+        self.state_log.append((self.enpassant_possible, self.castling_rights, self.eval_score, self.halfmove_clock))
         self.board[move.start_row][move.start_col] = "--"
         self.board[move.end_row][move.end_col] = move.piece_moved
         self.move_log.append(move) # log the move so we can undo it later
         self.white_to_move = not self.white_to_move # swap players
+        if self.white_to_move:
+            self.fullmove_number += 1
         # update king's position
         if move.piece_moved == "wK":
             self.white_king_location = (move.end_row, move.end_col)
@@ -60,20 +320,25 @@ class game_state():
         
         # pawn promotion
         if move.is_pawn_promotion:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
+            self.board[move.end_row][move.end_col] = move.piece_moved[0] + move.promotion_piece
         
         # en passant move
         if move.is_enpassant_move:
             move.piece_captured = self.board[move.start_row][move.end_col]
             self.board[move.start_row][move.end_col] = "--"  # capturing the pawn
+        if move.piece_captured != "--":
+            self.piece_count -= 1
+            self.halfmove_clock = 0
+        elif move.piece_moved[1] == "p":
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
         
         # update enpassant_possible variable
         if move.piece_moved[1] == "p" and abs(move.start_row - move.end_row) == 2: # only on 2 square pawn advances
             self.enpassant_possible = ((move.start_row + move.end_row)//2, move.end_col)
         else:
             self.enpassant_possible = ()
-        # update enpassant possible log
-        self.enpassant_possible_log.append(self.enpassant_possible)
         
         # castle move
         if move.is_castle_move:
@@ -86,34 +351,108 @@ class game_state():
         
         # update castling rights - whenever it's a rook or king move
         self.update_castle_rights(move)
-        self.castle_rights_log.append(castle_rights(self.current_castling_rights.wks, self.current_castling_rights.bks,
-                                                self.current_castling_rights.wqs, self.current_castling_rights.bqs))
+        self.update_zobrist_key(move)
+        if self.piece_square_values is not None:
+            self.update_eval_score(move)
+
+    '''
+    hash of the whole position from scratch, make_move/undo_move keep it up to date after this
+    '''
+    def compute_zobrist_key(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    key ^= ZOBRIST_PIECES[self.board[r][c]][r*8 + c]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.castling_rights]
+        if self.enpassant_possible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_possible[1]]
+        return key
+
+    '''
+    piece_square_values maps every piece to 64 values (row*8 + col), from white's point of view.
+    after this make_move and undo_move keep eval_score equal to the sum over the board
+    '''
+    def set_piece_square_values(self, piece_square_values):
+        self.piece_square_values = piece_square_values
+        self.eval_score = 0
+        self.eval_score_ply = len(self.move_log)
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    self.eval_score += piece_square_values[self.board[r][c]][r*8 + c]
+
+    # add the squares the move changed, called at the end of make_move
+    def update_eval_score(self, move):
+        values = self.piece_square_values
+        end_sq = move.end_row*8 + move.end_col
+        score = self.eval_score - values[move.piece_moved][move.start_row*8 + move.start_col]
+        score += values[self.board[move.end_row][move.end_col]][end_sq] # promoted piece if it promoted
+        if move.piece_captured != "--":
+            if move.is_enpassant_move:
+                score -= values[move.piece_captured][move.start_row*8 + move.end_col]
+            else:
+                score -= values[move.piece_captured][end_sq]
+        if move.is_castle_move:
+            rook = values[move.piece_moved[0] + "R"]
+            if move.end_col - move.start_col == 2: # kingside
+                score += rook[end_sq - 1] - rook[end_sq + 1]
+            else:
+                score += rook[end_sq + 1] - rook[end_sq - 2]
+        self.eval_score = score
+
+    # xor in only what the move changed, called at the end of make_move once state_log has the old state
+    def update_zobrist_key(self, move):
+        old_enpassant, old_castling_rights, _, _ = self.state_log[-1]
+        key = self.zobrist_key ^ ZOBRIST_BLACK_TO_MOVE
+        end_sq = move.end_row*8 + move.end_col
+        key ^= ZOBRIST_PIECES[move.piece_moved][move.start_row*8 + move.start_col]
+        key ^= ZOBRIST_PIECES[self.board[move.end_row][move.end_col]][end_sq] # promoted piece if it promoted
+        if move.piece_captured != "--":
+            if move.is_enpassant_move:
+                key ^= ZOBRIST_PIECES[move.piece_captured][move.start_row*8 + move.end_col]
+            else:
+                key ^= ZOBRIST_PIECES[move.piece_captured][end_sq]
+        if move.is_castle_move:
+            rook = ZOBRIST_PIECES[move.piece_moved[0] + "R"]
+            if move.end_col - move.start_col == 2: # kingside
+                key ^= rook[end_sq + 1] ^ rook[end_sq - 1]
+            else:
+                key ^= rook[end_sq - 2] ^ rook[end_sq + 1]
+        if old_castling_rights != self.castling_rights:
+            key ^= ZOBRIST_CASTLING[old_castling_rights] ^ ZOBRIST_CASTLING[self.castling_rights]
+        if old_enpassant != ():
+            key ^= ZOBRIST_ENPASSANT[old_enpassant[1]]
+        if self.enpassant_possible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_possible[1]]
+        self.zobrist_key = key
+        self.zobrist_log.append(key)
 
     '''
-    undo the last move
+    undo the last move, only puts back what make_move changed - no move generation,
+    so the search can call it as often as it likes
     '''
     def undo_move(self):
         if len(self.move_log) != 0: # make sure there is a move to undo
             move = self.move_log.pop()
             self.board[move.start_row][move.start_col] = move.piece_moved # replace pieces
             self.board[move.end_row][move.end_col] = move.piece_captured
+            if move.piece_captured != "--":
+                self.piece_count += 1
             self.white_to_move = not self.white_to_move # switch turns back
+            if not self.white_to_move:
+                self.fullmove_number -= 1
             # update king's position
             if move.piece_moved == "wK":
-                self.white_king_location = (move.end_row, move.end_col)
-                self.get_valid_moves()
+                self.white_king_location = (move.start_row, move.start_col)
             elif move.piece_moved == "bK":
-                self.black_king_location = (move.end_row, move.end_col)
-                self.get_valid_moves()
+                self.black_king_location = (move.start_row, move.start_col)
             # undo en passsant move
             if move.is_enpassant_move:
                 self.board[move.end_row][move.end_col] = "--" # leave landing square empty
                 self.board[move.start_row][move.end_col] = move.piece_captured
-
-            self.enpassant_possible_log.pop()
-            self.enpassant_possible = self.enpassant_possible_log[-1]
-            
-            
             # undo castling move
             if move.is_castle_move:
                 if move.end_col - move.start_col == 2: # kingside
@@ -122,56 +461,61 @@ class game_state():
                 else:
                     self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
                     self.board[move.end_row][move.end_col + 1] = "--"
-            # give back castling rights if we took them away
-            self.castle_rights_log.pop()
-            new_rights = self.castle_rights_log[-1]
-            self.current_castling_rights = castle_rights(new_rights.wks,new_rights.bks,new_rights.wqs,new_rights.bqs)
+            # en passant square, castling rights, eval and halfmove clock straight back off the state stack
+            self.enpassant_possible, self.castling_rights, self.eval_score, self.halfmove_clock = self.state_log.pop()
+            # key history already has the old key
+            self.zobrist_log.pop()
+            self.zobrist_key = self.zobrist_log[-1]
+            if len(self.move_log) < self.eval_score_ply and self.piece_square_values is not None:
+                self.set_piece_square_values(self.piece_square_values) # values were handed over after this move, rescan once
             # bug fix to undo checkmate and stalemate
             self.checkmate = False
             self.stalemate = False
     
-    # update castling rights - whenever it's a rook or king move            
+    # update castling rights - whenever a king or rook moves or a rook is captured
     def update_castle_rights(self, move):
-        if move.piece_moved == "wK":
-            self.current_castling_rights.wks = False
-            self.current_castling_rights.wqs = False
-        elif move.piece_moved == "bK":
-            self.current_castling_rights.bks = False
-            self.current_castling_rights.bqs = False
-        elif move.piece_moved == "wR":
-            if move.start_row == 7:
-                if move.start_col == 0: # queen side rook
-                    self.current_castling_rights.wqs = False
-                elif move.start_col == 7: #king side rook
-                    self.current_castling_rights.wks = False
-        elif move.piece_moved == "bR":
-            if move.start_row == 0:
-                if move.start_col == 0: # queen side rook
-                    self.current_castling_rights.bqs = False
-                elif move.start_col == 7: # king side rook
-                    self.current_castling_rights.bks = False
-        
-        # if rooks are captured
-        if move.piece_captured == "wR":
-            if move.end_row == 7:
-                if move.end_col == 0:
-                    self.current_castling_rights.wqs = False
-                elif move.end_col == 7:
-                    self.current_castling_rights.wks = False
-        elif move.piece_captured == "bR":
-            if move.end_row == 0:
-                if move.end_col == 0:
-                    self.current_castling_rights.bqs = False
-                elif move.end_col == 7:
-                    self.current_castling_rights.bks = False
+        if self.castling_rights:
+            self.castling_rights &= CASTLING_MASKS[move.start_row*8 + move.start_col] & CASTLING_MASKS[move.end_row*8 + move.end_col]
         
     '''
     all moves considering checks
     '''
     def get_valid_moves(self):
+        moves = self.get_legal_moves()
+        if len(moves) == 0: # either checkmate or stalemate
+            if self.in_check:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        return moves
+
+    '''
+    only captures, en passant and pawn promotions that are legal, for quiescence search.
+    the generators skip quiet moves instead of building them, and an empty list says nothing
+    about checkmate or stalemate so those flags are left alone
+    '''
+    def get_valid_captures(self):
+        self.include_quiets = False
+        try:
+            return self.get_legal_moves()
+        finally:
+            self.include_quiets = True
+
+    # the rest of the legal moves, get_valid_captures + get_valid_quiets is every legal move
+    def get_valid_quiets(self):
+        self.include_captures = False
+        try:
+            return self.get_legal_moves()
+        finally:
+            self.include_captures = True
+
+    # legal moves considering checks, shared by get_valid_moves, get_valid_captures and get_valid_quiets
+    def get_legal_moves(self):
         moves = []
-        moves_reordered = []
-        self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        if self.attack_map_key != self.zobrist_key: # captures then quiets from the same node reuse it
+            self.attacked = self.enemy_attack_map()
+            self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+            self.attack_map_key = self.zobrist_key
         if self.white_to_move:
             king_row = self.white_king_location[0]
             king_col = self.white_king_location[1]
@@ -196,21 +540,13 @@ class game_state():
                         valid_squares.append(valid_square)
                         if valid_square[0] == check_row and valid_square[1] == check_col: # once you get to piece end checks
                             break
-                # get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1): # go through backwards when removing from a list as iterating
-                    if moves[i].piece_moved[1] != "K": # move doesn't move king so it must block or capture
-                        if not (moves[i].end_row, moves[i].end_col) in valid_squares: # move doesn't block check or capture piece
-                            moves.remove(moves[i])
+                # keep king moves and moves that block the check or capture the piece (en passant lands behind it)
+                moves = [m for m in moves if m.piece_moved[1] == "K" or (m.end_row, m.end_col) in valid_squares or
+                         (m.is_enpassant_move and (m.start_row, m.end_col) == (check_row, check_col))]
             else: # double check, king has to move
                 self.king_moves(king_row, king_col, moves)
         else: # not in check so all moves are fine
             moves = self.get_all_possible_moves()
-        if len(moves) == 0: # either checkmate or stalemate
-            if self.in_check:
-                self.checkmate = True
-            else:
-                self.stalemate = True
-                
         # TODO mess with order of moves
         return moves
         
@@ -232,73 +568,91 @@ class game_state():
             start_row = self.black_king_location[0]
             start_col = self.black_king_location[1]
         # check outward from king for pins and checks, keep track of pins
-        directions = ((-1,0),(0,-1),(1,0),(0,1),(-1,-1),(-1,1),(1,-1),(1,1))
-        for j in range(len(directions)):
-            d = directions[j]
+        rays = RAY_SQUARES[start_row*8 + start_col]
+        for j in range(8):
+            d = DIRECTIONS[j]
             possible_pin = ()
-            for i in range(1,8):
-                end_row = start_row + d[0] * i
-                end_col = start_col + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0]== ally_color and end_piece[1] != "K":
-                        if possible_pin == (): # list allied piece could be pinned
-                            possible_pin = (end_row, end_col, d[0],d[1])
-                        else:# 2nd allied piece, so no pin or check possible in this direction
+            for i, (end_row, end_col) in enumerate(rays[j], 1):
+                end_piece = self.board[end_row][end_col]
+                if end_piece == "--":
+                    continue
+                if end_piece[0]== ally_color and end_piece[1] != "K":
+                    if possible_pin == (): # list allied piece could be pinned
+                        possible_pin = (end_row, end_col, d[0],d[1])
+                    else:# 2nd allied piece, so no pin or check possible in this direction
+                        break
+                elif end_piece[0] == enemy_color:
+                    type = end_piece[1]
+                    # 5 possibilities
+                    # straight away from king and piece is a rook
+                    # diagonally away from king and piece is a bishop
+                    # 1 square away diagonally from king and piece is a pawn
+                    # any direction away and piece is a queen
+                    # any direction 1 square away and piece is a king
+                    if (0 <= j <= 3 and type == "R") or \
+                        (4 <= j <= 7 and type == "B") or \
+                        (i == 1 and type == "p" and ((enemy_color == "w" and 6 <= j <= 7) or (enemy_color == "b" and 4 <= j <= 5))) or \
+                        (type == "Q") or (i == 1 and type == "K"):
+                        if possible_pin == (): # no piece blocking, so check
+                            in_check = True
+                            checks.append((end_row,end_col,d[0],d[1]))
                             break
-                    elif end_piece[0] == enemy_color:
-                        type = end_piece[1]
-                        # 5 possibilities
-                        # straight away from king and piece is a rook
-                        # diagonally away from king and piece is a bishop
-                        # 1 square away diagonally from king and piece is a pawn
-                        # any direction away and piece is a queen
-                        # any direction 1 square away and piece is a king
-                        if (0 <= j <= 3 and type == "R") or \
-                            (4 <= j <= 7 and type == "B") or \
-                            (i == 1 and type == "p" and ((enemy_color == "w" and 6 <= j <= 7) or (enemy_color == "b" and 4 <= j <= 5))) or \
-                            (type == "Q") or (i == 1 and type == "K"):
-                            if possible_pin == (): # no piece blocking, so check
-                                in_check = True
-                                checks.append((end_row,end_col,d[0],d[1]))
-                                break
-                            else: # piece blocking so pin
-                                pins.append(possible_pin)
-                                break
-                        else: # enemy piece not applying check
+                        else: # piece blocking so pin
+                            pins.append(possible_pin)
                             break
+                    else: # enemy piece not applying check
+                        break
                 else:
-                    break # off board
+                    break
         # check for knight checks
-        knight = ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1))
-        for m in knight:
-            end_row = start_row + m[0]
-            end_col = start_col + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == "N": # enemy knight attacking king
-                    in_check = True
-                    checks.append((end_row,end_col, m[0],m[1]))
+        for end_row, end_col in KNIGHT_SQUARES[start_row*8 + start_col]:
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] == enemy_color and end_piece[1] == "N": # enemy knight attacking king
+                in_check = True
+                checks.append((end_row,end_col, end_row - start_row, end_col - start_col))
         return in_check, pins, checks
-                                
-                                 
-                                
-    def square_under_attack(self,r,c):
+
+    '''
+    every square the side not to move attacks, as an 8x8 list of bools. the side to move's king
+    doesn't block, so stepping back along the line of a check shows up as attacked too.
+    built once per position by get_legal_moves, then king moves and castling just look squares up
+    '''
+    def enemy_attack_map(self):
         if self.white_to_move:
-            temp_king_location = self.white_king_location
-            self.white_king_location = (r,c)
-            under_attack = self.check_for_pins_and_checks()[0]
-            self.white_king_location = temp_king_location
-        else: 
-            temp_king_location = self.black_king_location
-            self.black_king_location = (r,c)
-            under_attack = self.check_for_pins_and_checks()[0]
-            self.black_king_location = temp_king_location
-        return under_attack
+            enemy_color = "b"
+            ally_king = "wK"
+        else:
+            enemy_color = "w"
+            ally_king = "bK"
+        attacked = [[False] * 8 for _ in range(8)]
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece[0] != enemy_color:
+                    continue
+                sq = r*8 + c
+                if piece[1] == "p":
+                    targets = PAWN_ATTACK_SQUARES[enemy_color][sq]
+                elif piece[1] == "N":
+                    targets = KNIGHT_SQUARES[sq]
+                elif piece[1] == "K":
+                    targets = KING_SQUARES[sq]
+                else: # sliders go until they hit something
+                    rays = RAY_SQUARES[sq]
+                    for j in SLIDER_DIRECTIONS[piece[1]]:
+                        for end_row, end_col in rays[j]:
+                            attacked[end_row][end_col] = True
+                            end_piece = self.board[end_row][end_col]
+                            if end_piece != "--" and end_piece != ally_king:
+                                break
+                    continue
+                for end_row, end_col in targets:
+                    attacked[end_row][end_col] = True
+        return attacked
+
+    def square_under_attack(self,r,c):
+        return self.enemy_attack_map()[r][c]
 
-        
-                            
-        
     '''
     all moves without considering checks
     ''' 
@@ -323,125 +677,64 @@ class game_state():
             if self.pins[i][0] == r and self.pins[i][1] == c:
                 piece_pinned = True
                 pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
                 break
         
-        if self.white_to_move: # white pawn moves
+        if self.white_to_move:
+            move_amount = -1
+            start_row = 6
+            enemy_color = "b"
             king_row, king_col = self.white_king_location
-            if self.board[r-1][c] == "--": # 1 square pawn advance
-                if not piece_pinned or pin_direction == (-1,0):
-                    moves.append(move((r,c),(r-1,c),self.board))
-                    if r == 6 and self.board[r-2][c] == "--": # 2 square pawn advance
-                        moves.append(move((r,c),(r-2,c),self.board))
-            if c-1 >= 0: # capturing left
-                if self.board[r-1][c-1][0]=="b": # enemy piece to capture
-                    if not piece_pinned or pin_direction == (-1,-1):
-                        moves.insert(0,move((r,c),(r-1,c-1),self.board))
-                elif (r-1,c-1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c: # king is left of the pawn
-                            # inside is between king and pawn, outside is between pawn and border
-                            inside_range = range(king_col + 1, c-1) # c-1 so doesn't include enemy pawn captured by enpassant
-                            outside_Range = range(c+1, self.board.length)
-                        else: # king is right of the pawn
-                            inside_range = range(king_col - 1, c, -1)
-                            outside_Range = range(c-2, -1, -1)
-                        for i in inside_range: 
-                            if self.board[r][i] != "--": # some other piece is blocking
-                                blocking_piece = True
-                        for i in outside_Range:
-                            square = self.board[r][i]
-                            if square[0] == "b" and (square[1] == "Q" or square[1] == "R"): # there is an attacking piece
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.insert(0,move((r,c),(r-1,c-1),self.board, enpassant_move = True))
-            if c+1 <= 7: # capturing right
-                if self.board[r-1][c+1][0] == "b": # enemy piece to capture
-                    if not piece_pinned or pin_direction == (-1,1):
-                        moves.insert(0,move((r,c),(r-1,c+1),self.board))
-                elif (r-1,c+1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c: # king is left of the pawn
-                            # inside is between king and pawn, outside is between pawn and border
-                            inside_range = range(king_col + 1, c) # c-1 so doesn't include enemy pawn captured by enpassant
-                            outside_Range = range(c+2, len(self.board))
-                        else: # king is right of the pawn
-                            inside_range = range(king_col - 1, c + 1, -1)
-                            outside_Range = range(c - 1, -1, -1)
-                        for i in inside_range: 
-                            if self.board[r][i] != "--": # some other piece is blocking
-                                blocking_piece = True
-                        for i in outside_Range:
-                            square = self.board[r][i]
-                            if square[0] == "b" and (square[1] == "Q" or square[1] == "R"): # there is an attacking piece
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.insert(0,move((r,c),(r-1,c+1),self.board, enpassant_move = True))    
-                
-
-        else: # black pawn moves
+        else:
+            move_amount = 1
+            start_row = 1
+            enemy_color = "w"
             king_row, king_col = self.black_king_location
-            if self.board[r+1][c] == "--": # 1 square pawn advance
-                if not piece_pinned or pin_direction == (-1,0):
-                    moves.append(move((r,c),(r+1,c),self.board))
-                    if r == 1 and self.board[r+2][c] == "--": # 2 square pawn advance
-                        moves.append(move((r,c),(r+2,c),self.board))
-            if c-1 >= 0: # capturing left
-                if self.board[r+1][c-1][0]=="w": # enemy piece to capture
-                    if not piece_pinned or pin_direction == (-1,0):
-                        moves.insert(0,move((r,c),(r+1,c-1),self.board))
-                elif (r+1,c-1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c: # king is left of the pawn
-                            # inside is between king and pawn, outside is between pawn and border
-                            inside_range = range(king_col + 1, c-1) # c-1 so doesn't include enemy pawn captured by enpassant
-                            outside_Range = range(c+1, self.board.length)
-                        else: # king is right of the pawn
-                            inside_range = range(king_col - 1, c, -1)
-                            outside_Range = range(c-2, -1, -1)
-                        for i in inside_range: 
-                            if self.board[r][i] != "--": # some other piece is blocking
-                                blocking_piece = True
-                        for i in outside_Range:
-                            square = self.board[r][i]
-                            if square[0] == "w" and (square[1] == "Q" or square[1] == "R"): # there is an attacking piece
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.insert(0,move((r,c),(r+1,c-1),self.board, enpassant_move = True))
-            if c+1 <= 7: # capturing right
-                if self.board[r+1][c+1][0] == "w": # enemy piece to capture
-                    if not piece_pinned or pin_direction == (-1,0):
-                        moves.insert(0,move((r,c),(r+1,c+1),self.board))
-                elif (r+1,c+1) == self.enpassant_possible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c: # king is left of the pawn
-                            # inside is between king and pawn, outside is between pawn and border
-                            inside_range = range(king_col + 1, c) # c-1 so doesn't include enemy pawn captured by enpassant
-                            outside_Range = range(c+2, self.board.length)
-                        else: # king is right of the pawn
-                            inside_range = range(king_col - 1, c + 1, -1)
-                            outside_Range = range(c - 1, -1, -1)
-                        for i in inside_range: 
-                            if self.board[r][i] != "--": # some other piece is blocking
-                                blocking_piece = True
-                        for i in outside_Range:
-                            square = self.board[r][i]
-                            if square[0] == "w" and (square[1] == "Q" or square[1] == "R"): # there is an attacking piece
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.insert(0,move((r,c),(r+1,c+1),self.board, enpassant_move = True))
+        end_row = r + move_amount
+
+        if self.board[end_row][c] == "--": # 1 square pawn advance
+            # pinned along the file it can still go up and down it
+            if not piece_pinned or pin_direction == (move_amount,0) or pin_direction == (-move_amount,0):
+                if self.include_captures if end_row == 0 or end_row == 7 else self.include_quiets: # promotions count as captures
+                    self.add_pawn_move((r,c),(end_row,c),moves)
+                if r == start_row and self.board[r + 2*move_amount][c] == "--" and self.include_quiets: # 2 square pawn advance
+                    moves.append(move((r,c),(r + 2*move_amount,c),self.board))
+        for dc in (-1,1): # capturing left and right
+            end_col = c + dc
+            if not self.include_captures or not 0 <= end_col < 8:
+                continue
+            if piece_pinned and pin_direction != (move_amount,dc) and pin_direction != (-move_amount,-dc):
+                continue
+            if self.board[end_row][end_col][0] == enemy_color: # enemy piece to capture
+                self.add_pawn_move((r,c),(end_row,end_col),moves)
+            elif (end_row,end_col) == self.enpassant_possible:
+                # both pawns leave the row, make sure that doesn't open the king to a rook or queen on it
+                attacking_piece = blocking_piece = False
+                if king_row == r:
+                    if king_col < c: # king is left of the pawn
+                        # inside is between king and pawns, outside is between pawns and border
+                        inside_range = range(king_col + 1, min(c, end_col))
+                        outside_range = range(max(c, end_col) + 1, 8)
+                    else: # king is right of the pawn
+                        inside_range = range(king_col - 1, max(c, end_col), -1)
+                        outside_range = range(min(c, end_col) - 1, -1, -1)
+                    for i in inside_range: 
+                        if self.board[r][i] != "--": # some other piece is blocking
+                            blocking_piece = True
+                    for i in outside_range:
+                        square = self.board[r][i]
+                        if square != "--": # first piece past the pawns
+                            attacking_piece = square[0] == enemy_color and (square[1] == "Q" or square[1] == "R")
+                            break
+                if not attacking_piece or blocking_piece:
+                    moves.append(move((r,c),(end_row,end_col),self.board, enpassant_move = True))
+
+    # a pawn reaching the last row can become any of the 4 pieces
+    def add_pawn_move(self, start_sq, end_sq, moves):
+        if end_sq[0] == 0 or end_sq[0] == 7:
+            for piece in ("Q","R","B","N"):
+                moves.append(move(start_sq, end_sq, self.board, promotion_piece = piece))
+        else:
+            moves.append(move(start_sq, end_sq, self.board))
 
     # rooks
     def rook_moves(self,r,c,moves):
@@ -451,8 +744,6 @@ class game_state():
             if self.pins[i][0] == r and self.pins[i][1] == c:
                 piece_pinned = True
                 pin_direction = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != "Q": # can't remove queen from pin on rook moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
                 break
         directions = ((-1,0), (0,-1), (1,0), (0,1))
         enemy_color = "b" if self.white_to_move else "w"
@@ -464,9 +755,11 @@ class game_state():
                     if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
                         end_piece = self.board[end_row][end_col]
                         if end_piece == "--": # empty space valid
-                            moves.append(move((r,c),(end_row,end_col),self.board))
+                            if self.include_quiets:
+                                moves.append(move((r,c),(end_row,end_col),self.board))
                         elif end_piece[0] == enemy_color: # enemy piece valid
-                            moves.insert(0,move((r,c),(end_row,end_col),self.board))
+                            if self.include_captures:
+                                moves.append(move((r,c),(end_row,end_col),self.board))
                             break
                         else: # friendly piece invalid
                             break
@@ -481,7 +774,6 @@ class game_state():
         for i in range(len(self.pins)-1,-1,-1):
             if self.pins[i][0] == r and self.pins[i][1] == c:
                 piece_pinned = True
-                self.pins.remove(self.pins[i])
                 break
         knight = ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1))
         ally_color = "w" if self.white_to_move else "b"
@@ -492,11 +784,10 @@ class game_state():
                 if not piece_pinned:
                     end_piece = self.board[end_row][end_col]
                     if end_piece == "--": # empty square
+                        if self.include_quiets:
+                            moves.append(move((r,c),(end_row,end_col),self.board))
+                    elif end_piece[0] != ally_color and self.include_captures:
                         moves.append(move((r,c),(end_row,end_col),self.board))
-                    elif end_piece[0] != ally_color:
-                         moves.insert(0,move((r,c),(end_row,end_col),self.board))
-                    else:
-                        break
                 
     
     # bishop
@@ -507,7 +798,6 @@ class game_state():
             if self.pins[i][0] == r and self.pins[i][1] == c:
                 piece_pinned = True
                 pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
                 break
         directions = ((-1,-1), (1,-1), (-1,1), (1,1))
         enemy_color = "b" if self.white_to_move else "w"
@@ -519,9 +809,11 @@ class game_state():
                     if not piece_pinned or pin_direction == d or pin_direction == (-d[0],-d[1]):
                         end_piece = self.board[end_row][end_col]
                         if end_piece == "--": # empty space valid
-                            moves.append(move((r,c),(end_row,end_col),self.board))
+                            if self.include_quiets:
+                                moves.append(move((r,c),(end_row,end_col),self.board))
                         elif end_piece[0] == enemy_color: # enemy piece valid
-                            moves.insert(0,move((r,c),(end_row,end_col),self.board))
+                            if self.include_captures:
+                                moves.append(move((r,c),(end_row,end_col),self.board))
                             break
                         else: # friendly piece invalid
                             break
@@ -535,65 +827,48 @@ class game_state():
     
     # king
     def king_moves(self,r,c,moves):
-        king = ((1,1),(-1,1),(-1,-1),(1,-1),(0,1),(1,0),(0,-1),(-1,0))
         ally_color = "w" if self.white_to_move else "b"
-        for i in range(8):
-            end_row = r + king[i][0]
-            end_col = c + king[i][1]
-            if 0 <= end_row <8 and 0 <= end_col <8: # on board
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color: # not an ally piece
-                    # place king on end square and check for checks
-                    if ally_color == "w":
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row,end_col)
-                    in_check, pins, checks = self.check_for_pins_and_checks()
-                    if not in_check:
-                        moves.append(move((r,c), (end_row, end_col), self.board))
-                    # place king back on original locatio
-                    if ally_color == "w":
-                        self.white_king_location = (r,c)
-                    else: 
-                        self.black_king_location = (r,c)
-        self.castle_moves(r,c,moves, ally_color)
+        for end_row, end_col in KING_SQUARES[r*8 + c]:
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] != ally_color and (self.include_captures if end_piece != "--" else self.include_quiets): # not an ally piece
+                if not self.attacked[end_row][end_col]: # the attack map already knows if it's safe
+                    moves.append(move((r,c), (end_row, end_col), self.board))
+        if self.include_quiets:
+            self.castle_moves(r,c,moves, ally_color)
     
     # generate all valid castle moves for the king at (r,c) and add them to the list of moves
     def castle_moves(self,r,c,moves,ally_color):
         if self.in_check:
             return # can't castle while in check
-        if (self.white_to_move and self.current_castling_rights.wks) or (not self.white_to_move and self.current_castling_rights.bks):
+        if self.castling_rights & (WHITE_KINGSIDE if self.white_to_move else BLACK_KINGSIDE):
             self.ks_castle_moves(r,c,moves,ally_color)
-        if (self.white_to_move and self.current_castling_rights.wqs) or (not self.white_to_move and self.current_castling_rights.bqs):
+        if self.castling_rights & (WHITE_QUEENSIDE if self.white_to_move else BLACK_QUEENSIDE):
             self.qs_castle_moves(r,c,moves,ally_color)
         
         
     def ks_castle_moves(self,r,c,moves,ally_color):
         if self.board[r][c+1] == "--" and self.board[r][c+2] == "--":
-            if not self.square_under_attack(r, c+1) and not self.square_under_attack(r,c+2):
-                moves.insert(0,move((r,c),(r,c+2),self.board, castle_move = True))
+            if not self.attacked[r][c+1] and not self.attacked[r][c+2]:
+                moves.append(move((r,c),(r,c+2),self.board, castle_move = True))
             
     
     
     def qs_castle_moves(self,r,c,moves,ally_color):
         if self.board[r][c-1] == "--" and self.board[r][c-2] == "--" and self.board[r][c-3] == "--":
-            if not self.square_under_attack(r, c-1) and not self.square_under_attack(r,c-2):
-                moves.insert(0,move((r,c),(r,c-2),self.board, castle_move = True))
+            if not self.attacked[r][c-1] and not self.attacked[r][c-2]:
+                moves.append(move((r,c),(r,c-2),self.board, castle_move = True))
     
     
                                
-class castle_rights():
-    def __init__(self,wks,bks,wqs,bqs):
-        self.wks = wks
-        self.wqs = wqs
-        self.bks = bks
-        self.bqs = bqs
-            
-
-
-
-
+'''
+millions of these get made during a search so they use __slots__ (no per instance __dict__)
+and moveID packs the whole move into 16 bits: start square, end square, promotion piece.
+the transposition table, killers and opening book keep just the moveID and match it
+against the moveIDs of the generated moves
+'''
 class move():
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_moved", "piece_captured",
+                 "is_pawn_promotion", "promotion_piece", "moveID", "is_enpassant_move", "is_castle_move", "is_capture")
     # maps keys to values
     # key : value
     ranks_to_rows = {"1":7,"2":6,"3":5,"4":4,
@@ -603,16 +878,20 @@ class move():
                      "e":4,"f":5,"g":6,"h":7}
     cols_to_files = {v:k for k,v in files_to_cols.items()}
     
-    def __init__(self, start_sq, end_sq, board, enpassant_move = False, castle_move = False):
+    promotion_codes = {"Q":0, "R":1, "B":2, "N":3}
+
+    def __init__(self, start_sq, end_sq, board, enpassant_move = False, castle_move = False, promotion_piece = "Q"):
         self.start_row = start_sq[0]
         self.start_col = start_sq[1]
         self.end_row = end_sq[0]
         self.end_col = end_sq[1]
         self.piece_moved = board[self.start_row][self.start_col]
         self.piece_captured = board[self.end_row][self.end_col]
-        self.moveID = self.start_row*1000 + self.start_col*100 + self.end_row*10 + self.end_col
         # pawn promotion
         self.is_pawn_promotion = (self.piece_moved == "wp" and self.end_row == 0) or (self.piece_moved == "bp" and self.end_row == 7)
+        self.promotion_piece = promotion_piece
+        # bits 0-5 start square, 6-11 end square (row*8 + col), 12-13 promotion piece
+        self.moveID = (self.start_row*8 + self.start_col) | (self.end_row*8 + self.end_col) << 6 | self.promotion_codes[promotion_piece] << 12
         # en passant
         self.is_enpassant_move = enpassant_move
         self.is_castle_move = castle_move
@@ -624,11 +903,18 @@ class move():
         if isinstance(other, move):
             return self.moveID == other.moveID
         return False
+
+    def __hash__(self):
+        return self.moveID
+
             
     
     def get_chess_notation(self):
         # add to make this like real chess notation
-        return self.get_rank_file(self.start_row,self.start_col) + self.get_rank_file(self.end_row,self.end_col)
+        notation = self.get_rank_file(self.start_row,self.start_col) + self.get_rank_file(self.end_row,self.end_col)
+        if self.is_pawn_promotion:
+            notation += self.promotion_piece.lower()
+        return notation
     
     def get_rank_file(self,r,c):
         return self.cols_to_files[c] + self.rows_to_ranks[r]
@@ -643,14 +929,16 @@ class move():
         
         # pawn moves
         if self.piece_moved[1] == "p":
-            if self.is_capture:
-             return self.cols_to_files[self.start_col] + "x" + end_square
+            if self.is_capture or self.is_enpassant_move:
+                move_string = self.cols_to_files[self.start_col] + "x" + end_square
             else:
-                return end_square
-            
+                move_string = end_square
             # pawn promotions
-        # two of same type of piece moving to a square, eg. Nbd2 if both knights can move to d2
-        # adding + for check move and # for checkmate move
+            if self.is_pawn_promotion:
+                move_string += "=" + self.promotion_piece
+            return move_string
+        # two of same type of piece moving to a square (Nbd2) and + or # for check need the whole
+        # position, not just the move, chess_pgn.move_to_san adds them
         
         # piece moves
         move_string = self.piece_moved[1]
@@ -0,0 +1,232 @@
+'''
+Headless entry point - play, analyse and search positions with no display.
+Only imports the engine and AI, never pygame, so batch workers start fast.
+
+python chess_headless.py search --fen "<fen>" --time 2
+python chess_headless.py search --depth 5 --workers 0    root moves split over every core
+python chess_headless.py analyse --fen "<fen>" --depth 2
+python chess_headless.py play --time 1 --max-plies 200
+python chess_headless.py check                           positions with a known best move or result, and bad FENs
+
+or from python:
+    gs = chess_headless.new_game_state(fen)
+    result = chess_headless.search_position(gs, time_limit = 2)
+'''
+import argparse
+import random
+import sys
+import time
+import chess_engine, chess_ai, chess_bitboard, chess_book, chess_tablebase
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+USE_BITBOARDS = False # same as chess_main, the 8x8 list game_state is faster for now
+
+# (what it tests, fen, depth, best move, result of play_game from the fen at that depth)
+SEARCH_CHECKS = [
+    ("mate on the hundredth quiet ply", "7k/8/6K1/8/8/8/8/R7 w - - 99 80", 2, "a1a8", "1-0"),
+]
+# (what it tests, fen, get_fen after loading it or None if load_fen must raise ValueError)
+FEN_CHECKS = [
+    ("no king", "8/8/8/8/8/8/8/4K3 w - - 0 1", None),
+    ("two kings", "4k3/8/8/8/8/8/8/3KK3 w - - 0 1", None),
+    ("pawn on the last rank", "3Pk3/8/8/8/8/8/8/4K3 w - - 0 1", None),
+    ("side to move isn't w or b", "4k3/8/8/8/8/8/8/4K3 x - - 0 1", None),
+    ("castling rights that aren't KQkq", "4k3/8/8/8/8/8/8/R3K3 w QQ - 0 1", None),
+    ("castling right with no rook", "4k3/8/8/8/8/8/8/4K3 w K - 0 1", "4k3/8/8/8/8/8/8/4K3 w - - 0 1"),
+    ("castling rights with the king moved", "r3k2r/8/8/8/8/8/8/R2K3R w KQkq - 0 1", "r3k2r/8/8/8/8/8/8/R2K3R w kq - 0 1"),
+    ("en passant square on the mover's side", "4k3/8/8/3pP3/8/8/8/4K3 w - d3 0 1", None),
+    ("en passant square with no pawn", "4k3/8/8/8/8/8/8/4K3 w - e6 0 1", None),
+    ("en passant square for black", "4k3/8/8/8/3Pp3/8/8/4K3 b - d3 0 1", "4k3/8/8/8/3Pp3/8/8/4K3 b - d3 0 1"),
+]
+EVAL_CHECK_GAMES = 20 # random games scored incrementally and by a full board scan at every ply
+
+
+def new_game_state(fen = None, bitboards = USE_BITBOARDS):
+    gs = chess_bitboard.bitboard_state() if bitboards else chess_engine.game_state()
+    if fen is not None:
+        gs.load_fen(fen)
+    return gs
+
+# legal move from coordinate notation like "e2e4" or "e7e8q", None if there isn't one
+def find_move(gs, notation):
+    for move in gs.get_valid_moves():
+        if move.get_chess_notation() == notation:
+            return move
+    return None
+
+def play_moves(gs, notations):
+    for notation in notations:
+        move = find_move(gs, notation)
+        if move is None:
+            raise ValueError("illegal move: " + notation)
+        gs.make_move(move)
+        gs.turn_counter += 1
+
+'''
+search the position with iterative deepening, with no limits it searches to chess_ai.DEPTH.
+workers other than 1 splits the root moves over that many processes, 0 is one per core.
+pass a chess_ai.searcher to keep its transposition table between searches.
+score is from the side to move's point of view
+'''
+def search_position(gs, depth = None, time_limit = None, max_nodes = None, workers = 1, searcher = None):
+    if searcher is None:
+        searcher = chess_ai.searcher()
+    valid_moves = gs.get_valid_moves()
+    if len(valid_moves) == 0:
+        return {"best_move": None, "score": chess_ai.score_board(gs) * (1 if gs.white_to_move else -1),
+                "depth": 0, "nodes": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    if workers == 1:
+        best_move = searcher.find_best_move_iterative(gs, valid_moves, time_limit = time_limit, max_nodes = max_nodes, max_depth = depth)
+    else:
+        best_move = searcher.find_best_move_parallel(gs, valid_moves, workers, time_limit = time_limit, max_nodes = max_nodes,
+                                                     max_depth = depth)
+    seconds = time.perf_counter() - start
+    return {"best_move": best_move.get_chess_notation() if best_move is not None else None,
+            "score": searcher.score, "depth": searcher.completed_depth,
+            "nodes": searcher.nodes, "seconds": seconds}
+
+# every legal move with its score from a search of the position after it, best first
+def analyse_position(gs, depth = 2):
+    results = []
+    searcher = chess_ai.searcher()
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        result = search_position(gs, depth = max(depth - 1, 1), searcher = searcher)
+        gs.undo_move()
+        score = -result["score"] if result["score"] is not None else None
+        results.append((move.get_chess_notation(), score))
+    results.sort(key = lambda result: result[1] if result[1] is not None else -chess_ai.CHECKMATE, reverse = True)
+    return results
+
+def game_result(gs):
+    if gs.checkmate:
+        return "0-1" if gs.white_to_move else "1-0"
+    if gs.stalemate or gs.draw_reason() is not None:
+        return "1/2-1/2"
+    return "*"
+
+'''
+the AI plays both sides until the game ends, by checkmate, stalemate or one of the draw rules,
+or max_plies is reached. on_move(gs, move) is called after every move
+'''
+def play_game(fen = None, depth = None, time_limit = None, max_plies = 200, on_move = None, book = None, tablebase = None):
+    gs = new_game_state(fen)
+    searcher = chess_ai.searcher(book = book, tablebase = tablebase)
+    moves = []
+    while len(moves) < max_plies:
+        valid_moves = gs.get_valid_moves()
+        if len(valid_moves) == 0 or gs.draw_reason() is not None: # checkmate is looked for first
+            break
+        move = searcher.find_best_move_iterative(gs, valid_moves, time_limit = time_limit, max_depth = depth)
+        if move is None:
+            move = chess_ai.find_random_move(valid_moves)
+        gs.make_move(move)
+        gs.turn_counter += 1
+        moves.append(move.get_chess_notation())
+        if on_move is not None:
+            on_move(gs, move)
+    gs.get_valid_moves() # sets checkmate/stalemate for the final position
+    draw_reason = gs.draw_reason() if not gs.checkmate and not gs.stalemate else None
+    return {"result": game_result(gs), "moves": moves, "draw_reason": draw_reason}
+
+
+'''
+play random games on both board representations and score every position with score_board and
+score_board_full, then undo back to the start checking score_board gives the same scores again.
+returns (positions, scores that differ)
+'''
+def check_incremental_eval(games = EVAL_CHECK_GAMES, max_plies = 160, seed = 1):
+    rng = random.Random(seed)
+    positions = differ = 0
+    for game in range(games):
+        gs = new_game_state(bitboards = game % 2 == 1)
+        scores = []
+        while len(gs.move_log) < max_plies:
+            valid_moves = gs.get_valid_moves()
+            if len(valid_moves) == 0:
+                break
+            scores.append(chess_ai.score_board(gs))
+            positions += 1
+            if scores[-1] != chess_ai.score_board_full(gs):
+                differ += 1
+            gs.make_move(valid_moves[rng.randrange(len(valid_moves))])
+            gs.turn_counter += 1 # past 70 the king term changes
+        while gs.move_log:
+            gs.undo_move()
+            gs.turn_counter -= 1
+            positions += 1
+            if chess_ai.score_board(gs) != scores.pop():
+                differ += 1
+    return positions, differ
+
+'''
+search and play out every SEARCH_CHECKS position, load every FEN_CHECKS one and check the
+incremental evaluation, print a line for each and return the number that failed
+'''
+def run_checks():
+    failures = 0
+    positions, differ = check_incremental_eval()
+    if differ:
+        failures += 1
+    print(("ok   " if differ == 0 else "FAIL ") + "incremental eval: " + str(differ) + " of " + str(positions) +
+          " positions differ from score_board_full")
+    for name, fen, expected in FEN_CHECKS:
+        try:
+            loaded = new_game_state(fen).get_fen()
+        except ValueError:
+            loaded = None
+        if loaded != expected:
+            failures += 1
+        print(("ok   " if loaded == expected else "FAIL ") + name + ": " + str(loaded or "ValueError") +
+              " (expected " + str(expected or "ValueError") + ")")
+    for name, fen, depth, best_move, result in SEARCH_CHECKS:
+        found = search_position(new_game_state(fen), depth)["best_move"]
+        game = play_game(fen, depth, max_plies = 20)
+        ok = found == best_move and game["result"] == result
+        if not ok:
+            failures += 1
+        print(("ok   " if ok else "FAIL ") + name + ": " + str(found) + " (expected " + best_move + "), game " + game["result"] +
+              (" " + game["draw_reason"] if game["draw_reason"] is not None else "") + " (expected " + result + ")")
+    return failures
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "play, analyse or search chess positions without a display")
+    parser.add_argument("command", choices = ("search", "analyse", "play", "check"))
+    parser.add_argument("--fen", default = None, help = "starting position, default is the normal start")
+    parser.add_argument("--moves", nargs = "*", default = [], help = "moves to play from the fen first, eg. e2e4 e7e5")
+    parser.add_argument("--depth", type = int, default = None)
+    parser.add_argument("--time", type = float, default = None, help = "seconds per move")
+    parser.add_argument("--nodes", type = int, default = None)
+    parser.add_argument("--workers", type = int, default = 1, help = "search processes, 0 for one per core")
+    parser.add_argument("--max-plies", type = int, default = 200)
+    parser.add_argument("--book", default = None, help = "opening book file for search and play")
+    parser.add_argument("--tablebases", default = None, help = "directory of generated tablebases for search and play")
+    args = parser.parse_args(argv)
+    book = chess_book.opening_book(args.book) if args.book is not None else None
+    tablebase = chess_tablebase.tablebases(args.tablebases) if args.tablebases is not None else None
+
+    if args.command == "check":
+        return 0 if run_checks() == 0 else 1
+    if args.command == "play":
+        game = play_game(args.fen, args.depth, args.time, args.max_plies,
+                         on_move = lambda gs, move: print(move.get_chess_notation(), flush = True), book = book, tablebase = tablebase)
+        print("result " + game["result"] + (" (" + game["draw_reason"] + ")" if game["draw_reason"] is not None else ""))
+        return 0
+
+    gs = new_game_state(args.fen)
+    play_moves(gs, args.moves)
+    if args.command == "search":
+        result = search_position(gs, args.depth, args.time, args.nodes, args.workers, chess_ai.searcher(book = book, tablebase = tablebase))
+        print("bestmove " + str(result["best_move"]) + " score " + str(result["score"]) + " depth " + str(result["depth"]) +
+              " nodes " + str(result["nodes"]) + " time " + str(round(result["seconds"], 2)))
+    else:
+        print("static eval " + str(chess_ai.score_board(gs)))
+        for notation, score in analyse_position(gs, args.depth or 2):
+            print(notation + " " + str(score))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
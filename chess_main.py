@@ -1,10 +1,13 @@
 '''
 Handling user input and displaying current game state
 '''
+import copy
+import os
+import queue
+import threading
 import pygame as p
-import chess_engine,chess_ai
+import chess_engine,chess_ai,chess_bitboard,chess_book,chess_pgn,chess_tablebase
 
-p.init()
 BOARD_WIDTH = BOARD_HEIGHT = 512 # 400 is another option
 MOVE_LOG_PANEL_WIDTH = 250
 MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
@@ -12,6 +15,10 @@ DIMENSION = 8 # dimenstions of a chess board are 8x8
 SQ_SIZE = BOARD_HEIGHT // DIMENSION
 MAX_FPS = 15 # for animations later on
 IMAGES = {}
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Pictures")
+# bitboard move generation, off while chess_bitboard is slower overall than the 8x8 list version
+# (its generator is a bit faster but make_move/undo_move update the board and the bitboards both)
+USE_BITBOARDS = False
 
 '''
 load in images
@@ -21,18 +28,28 @@ only called once in the main
 def load_images():
     pieces = ["wp", "wR", "wN", "wB","wQ","wK", "bp", "bR","bN","bB","bQ","bK"]
     for piece in pieces:
-        IMAGES[piece] = p.transform.scale(p.image.load("fun_projects\Chess\Pictures/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
+        IMAGES[piece] = p.transform.scale(p.image.load(os.path.join(IMAGE_DIR, piece + ".png")), (SQ_SIZE, SQ_SIZE))
     # note: we can acces an image by saying 'IMAGES['wp']'
     
+'''
+start position using whichever board representation is selected
+'''
+def new_game_state():
+    if USE_BITBOARDS:
+        return chess_bitboard.bitboard_state()
+    return chess_engine.game_state()
+
 '''
 The main driver for our code.  This handles user input and updating graphics
 '''
 def main():
+    p.init()
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH,BOARD_HEIGHT))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = chess_engine.game_state()
+    gs = new_game_state()
     valid_moves = gs.get_valid_moves()
+    san_log = [] # move log in SAN, worked out as each move is made
     move_made = False # flag variable for when a move is made
     animate = False # flag variable for when to animate
     load_images() # only do this once, before the loop
@@ -44,11 +61,20 @@ def main():
     player_two = False # if a human is playing black, this is true, if AI is black, then false
     move_log_font = p.font.SysFont("Arial", 15, False, False) # move log font information
     AI_move = None
+    # the AI searches a copy of the game in its own thread so the window keeps drawing
+    # build book.bin with chess_book.py and the tablebases with chess_tablebase.py to use them
+    ai_searcher = chess_ai.searcher(book = chess_book.open_default_book(), tablebase = chess_tablebase.open_default_tablebases())
+    ai_thinking = False
+    move_finder_thread = None
+    return_queue = queue.Queue() # the thread puts its move here
     while running:
         is_human_turn = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+                if ai_thinking:
+                    cancel_ai_search(ai_searcher, move_finder_thread, return_queue)
+                    ai_thinking = False
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not game_over and is_human_turn:
@@ -66,6 +92,7 @@ def main():
                         move = chess_engine.move(player_clicks[0],player_clicks[1],gs.board)
                         for i in range(len(valid_moves)):  
                             if move == valid_moves[i]:
+                                san_log.append(chess_pgn.move_to_san(gs, valid_moves[i], valid_moves))
                                 gs.make_move(valid_moves[i])
                                 move_made = True
                                 animate = True
@@ -77,13 +104,22 @@ def main():
             # key handlers
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_BACKSPACE: #undo when 'backspace' is pressed
+                    if ai_thinking: # the search is for a position that's going away
+                        cancel_ai_search(ai_searcher, move_finder_thread, return_queue)
+                        ai_thinking = False
+                    if len(gs.move_log) != 0:
+                        san_log.pop()
                     gs.undo_move()
                     move_made = True
                     animate = False
                     game_over = False
                 if e.key == p.K_r: # reset the board when "r" is pressed
-                    gs = chess_engine.game_state()
+                    if ai_thinking:
+                        cancel_ai_search(ai_searcher, move_finder_thread, return_queue)
+                        ai_thinking = False
+                    gs = new_game_state()
                     valid_moves = gs.get_valid_moves()
+                    san_log = []
                     sq_selected = ()
                     player_clicks = []
                     move_made = False
@@ -92,17 +128,19 @@ def main():
                     
         # AI move finder logic  
         if not game_over and not is_human_turn:
-            
-            #AI_move = chess_ai.find_random_move(valid_moves)
-            #AI_move = chess_ai.greedy_move(gs, valid_moves)
-            #AI_move = chess_ai.find_best_move_minmax(gs,valid_moves)
-            #AI_move = chess_ai.find_best_move_negamax(gs,valid_moves)
-            AI_move = chess_ai.find_best_move_negamax_aplhabeta(gs,valid_moves)
-            if AI_move == None:
-                AI_move = chess_ai.find_random_move(valid_moves) # random moves
-            gs.make_move(AI_move)
-            move_made = True
-            animate = True
+            if not ai_thinking: # start thinking, then check back every frame
+                ai_thinking = True
+                move_finder_thread = threading.Thread(target = find_ai_move, args = (ai_searcher, copy.deepcopy(gs), return_queue),
+                                                      daemon = True)
+                move_finder_thread.start()
+            elif not move_finder_thread.is_alive():
+                ai_thinking = False
+                AI_move = return_queue.get()
+                AI_move = valid_moves[valid_moves.index(AI_move)] # same move in this game's move list
+                san_log.append(chess_pgn.move_to_san(gs, AI_move, valid_moves))
+                gs.make_move(AI_move)
+                move_made = True
+                animate = True
             
         
         
@@ -114,7 +152,9 @@ def main():
             valid_moves = gs.get_valid_moves()
             
         move_made = False            
-        draw_game_state(screen,gs, valid_moves, sq_selected, move_log_font)
+        draw_game_state(screen,gs, valid_moves, sq_selected, san_log, move_log_font)
+        if ai_thinking:
+            draw_thinking_text(screen, ai_searcher, move_log_font)
 
         if gs.checkmate:
             game_over = True
@@ -125,17 +165,43 @@ def main():
         elif gs.stalemate:
             game_over = True
             draw_endgame_text(screen, "Stalemate")
+        elif gs.draw_reason() is not None: # threefold repetition, fifty moves or insufficient material
+            game_over = True
+            draw_endgame_text(screen, "Draw by " + gs.draw_reason())
         clock.tick(MAX_FPS)
         p.display.flip()
 
+'''
+runs in the move finder thread on its own copy of the game state
+'''
+def find_ai_move(searcher, gs, return_queue):
+    valid_moves = gs.get_valid_moves()
+    #AI_move = chess_ai.find_random_move(valid_moves)
+    #AI_move = chess_ai.greedy_move(gs, valid_moves)
+    #AI_move = chess_ai.find_best_move_minmax(gs,valid_moves)
+    #AI_move = chess_ai.find_best_move_negamax(gs,valid_moves)
+    #AI_move = chess_ai.find_best_move_negamax_aplhabeta(gs,valid_moves)
+    AI_move = searcher.find_best_move_iterative(gs, valid_moves, time_limit = chess_ai.TIME_LIMIT)
+    if AI_move == None:
+        AI_move = chess_ai.find_random_move(valid_moves) # random moves
+    return_queue.put(AI_move)
+
+# stop the search and throw its move away, it only takes until the next node count check
+def cancel_ai_search(searcher, move_finder_thread, return_queue):
+    while move_finder_thread.is_alive(): # again until it ends, the search clears the flag as it starts
+        searcher.stop()
+        move_finder_thread.join(0.05)
+    while not return_queue.empty():
+        return_queue.get()
+
 '''
 Responsible for all the graphics for current game state
 '''
-def draw_game_state(screen, gs, valid_moves, sq_selected, move_log_font):
+def draw_game_state(screen, gs, valid_moves, sq_selected, san_log, move_log_font):
     draw_board(screen) # draw squares on the board
     highlight_squares(screen, gs, valid_moves, sq_selected)
     draw_pieces(screen, gs.board) # draw pieces on top of those squares
-    draw_move_log(screen, gs, move_log_font)
+    draw_move_log(screen, san_log, move_log_font)
 
 '''
 draw squares on board (top left square is always light)
@@ -179,17 +245,16 @@ def draw_pieces(screen, board):
 '''
 Draws move log
 '''      
-def draw_move_log(screen, gs, move_log_font):
+def draw_move_log(screen, san_log, move_log_font):
     
     move_log_rect = p.Rect(BOARD_WIDTH,0,MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
     p.draw.rect(screen, p.Color("Black"), move_log_rect)
-    move_log = gs.move_log
     move_texts = []
     move_string = None
-    for i in range(0, len(move_log), 2):
-        move_string =  str(i//2 + 1) + ". " + str(move_log[i]) + "  "
-        if i+1 < len(move_log): # make sure black made a move
-            move_string += str(move_log[i+1]) + "    "
+    for i in range(0, len(san_log), 2):
+        move_string =  str(i//2 + 1) + ". " + san_log[i] + "  "
+        if i+1 < len(san_log): # make sure black made a move
+            move_string += san_log[i+1] + "    "
         move_texts.append(move_string)
     moves_per_row = 3
     padding = 5
@@ -232,6 +297,15 @@ def animate_move(move,screen,board,clock):
         p.display.flip()
         clock.tick(60)
 
+'''
+live search progress at the bottom of the move log while the AI thinks
+'''
+def draw_thinking_text(screen, searcher, move_log_font):
+    text = "thinking... depth " + str(searcher.root_depth) + ", " + str(searcher.nodes) + " nodes"
+    text_object = move_log_font.render(text, True, p.Color("yellow"))
+    padding = 5
+    screen.blit(text_object, (BOARD_WIDTH + padding, MOVE_LOG_PANEL_HEIGHT - text_object.get_height() - padding))
+
 '''
 drawing text at the end of the game
 '''
@@ -247,4 +321,5 @@ def draw_endgame_text(screen, text):
     
     
     
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
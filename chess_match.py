@@ -0,0 +1,227 @@
+'''
+Self-play matches between engine variants, to check a change doesn't cost playing strength.
+Games are spread over a process pool. Every random opening is played twice with the colors
+swapped, so a lopsided opening evens out. Games are adjudicated by the draw rules and a
+ply limit. The report has wins/draws/losses for the first engine, the Elo difference with a
+95% error bar, and the nodes per second and time per move of each side.
+
+An engine is a variant name, optionally followed by settings, eg.
+    random  greedy  minmax:depth=2  negamax:depth=2  alphabeta:depth=3,ordering=0
+    iterative:time=0.1  iterative:nodes=20000,delta=0  iterative:time=0.1,evalcache=100000
+
+python chess_match.py iterative:time=0.1 alphabeta:depth=3 --games 200 --workers 0
+'''
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+import time
+import chess_ai, chess_headless
+
+VARIANTS = ("random", "greedy", "minmax", "negamax", "alphabeta", "iterative")
+SETTINGS = {"depth": int, "time": float, "nodes": int, "ordering": int, "delta": float, "evalcache": int}
+OPENING_PLIES = 4 # random moves played before the engines take over
+MAX_PLIES = 300 # a game still going after this many plies is a draw
+
+
+# "alphabeta:depth=3,ordering=0" -> {"name": ..., "variant": "alphabeta", "depth": 3, "ordering": 0}
+def parse_engine(text):
+    variant, _, options = text.partition(":")
+    if variant not in VARIANTS:
+        raise ValueError("unknown engine variant: " + variant)
+    engine = {"name": text, "variant": variant}
+    for option in options.split(","):
+        if not option:
+            continue
+        key, _, value = option.partition("=")
+        if key not in SETTINGS:
+            raise ValueError("unknown engine setting: " + key)
+        engine[key] = SETTINGS[key](value)
+    return engine
+
+def new_searcher(engine):
+    return chess_ai.searcher(depth = engine.get("depth", chess_ai.DEPTH),
+                             move_ordering = bool(engine.get("ordering", chess_ai.MOVE_ORDERING)),
+                             delta_margin = engine.get("delta", chess_ai.DELTA_MARGIN),
+                             eval_cache_size = engine.get("evalcache", chess_ai.EVAL_CACHE_SIZE))
+
+# the engine's move and the nodes it searched for it
+def engine_move(engine, searcher, gs, valid_moves):
+    variant = engine["variant"]
+    if variant == "random":
+        return chess_ai.find_random_move(valid_moves), 0
+    if variant == "greedy":
+        return chess_ai.greedy_move(gs, valid_moves), 0
+    if variant == "minmax":
+        move = searcher.find_best_move_minmax(gs, valid_moves)
+    elif variant == "negamax":
+        move = searcher.find_best_move_negamax(gs, valid_moves)
+    elif variant == "alphabeta":
+        move = searcher.find_best_move_negamax_aplhabeta(gs, valid_moves)
+    else:
+        time_limit = engine.get("time")
+        max_nodes = engine.get("nodes")
+        if time_limit is None and max_nodes is None:
+            move = searcher.find_best_move_iterative(gs, valid_moves, max_depth = engine.get("depth"))
+        else:
+            move = searcher.find_best_move_iterative(gs, valid_moves, time_limit = time_limit, max_nodes = max_nodes,
+                                                     max_depth = engine.get("depth", chess_ai.MAX_DEPTH))
+    return move, searcher.nodes
+
+# the random opening for a pair of games, as coordinate notation moves
+def random_opening(rng, plies):
+    gs = chess_headless.new_game_state()
+    moves = []
+    for _ in range(plies):
+        valid_moves = gs.get_valid_moves()
+        if len(valid_moves) == 0:
+            break
+        move = valid_moves[rng.randrange(len(valid_moves))]
+        gs.make_move(move)
+        moves.append(move.get_chess_notation())
+    return moves
+
+
+'''
+runs in a pool worker: play one game from its opening between its white and black engines.
+returns the result, why the game ended, the number of plies and per color nodes, seconds and moves
+'''
+def play_match_game(game):
+    random.seed(game["seed"]) # the searches shuffle moves, this makes a game repeatable
+    gs = chess_headless.new_game_state()
+    chess_headless.play_moves(gs, game["opening"])
+    engines = {"w": game["white"], "b": game["black"]}
+    searchers = {color: new_searcher(engine) for color, engine in engines.items()}
+    stats = {color: {"nodes": 0, "seconds": 0.0, "moves": 0} for color in engines}
+    result, reason = "1/2-1/2", "ply limit"
+    while len(gs.move_log) < game["max_plies"]:
+        valid_moves = gs.get_valid_moves()
+        if len(valid_moves) == 0: # before the draw rules, a mate on the hundredth quiet ply still wins
+            result = chess_headless.game_result(gs)
+            reason = "checkmate" if gs.checkmate else "stalemate"
+            break
+        if gs.draw_reason() is not None: # repetition, fifty moves or insufficient material
+            reason = gs.draw_reason()
+            break
+        color = "w" if gs.white_to_move else "b"
+        start = time.perf_counter()
+        move, nodes = engine_move(engines[color], searchers[color], gs, valid_moves)
+        stats[color]["seconds"] += time.perf_counter() - start
+        stats[color]["nodes"] += nodes
+        stats[color]["moves"] += 1
+        if move is None:
+            move = chess_ai.find_random_move(valid_moves)
+        gs.make_move(move)
+        gs.turn_counter += 1
+    return {"pair": game["pair"], "swapped": game["swapped"], "result": result, "reason": reason,
+            "plies": len(gs.move_log), "stats": stats}
+
+
+'''
+play games between engine a and engine b, half with each color, and return the totals from engine a's
+point of view. on_game(game, summary) is called with the running totals as each game finishes
+'''
+def run_match(engine_a, engine_b, games = 100, workers = 0, opening_plies = OPENING_PLIES, max_plies = MAX_PLIES, seed = 1,
+              on_game = None):
+    rng = random.Random(seed)
+    tasks = []
+    for pair in range((games + 1) // 2):
+        opening = random_opening(rng, opening_plies)
+        for swapped in (False, True):
+            if len(tasks) < games:
+                tasks.append({"pair": pair, "swapped": swapped, "opening": opening, "seed": rng.getrandbits(32),
+                              "white": engine_b if swapped else engine_a, "black": engine_a if swapped else engine_b,
+                              "max_plies": max_plies})
+    if workers <= 0:
+        workers = multiprocessing.cpu_count()
+    summary = new_summary()
+    with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+        for game in pool.imap_unordered(play_match_game, tasks):
+            add_game(summary, game)
+            if on_game is not None:
+                on_game(game, summary)
+    return summary
+
+def new_summary():
+    return {"wins": 0, "draws": 0, "losses": 0, "reasons": {},
+            "a": {"nodes": 0, "seconds": 0.0, "moves": 0}, "b": {"nodes": 0, "seconds": 0.0, "moves": 0}}
+
+def add_game(summary, game):
+    a_color, b_color = ("b", "w") if game["swapped"] else ("w", "b")
+    if game["result"] == "1/2-1/2":
+        summary["draws"] += 1
+    elif game["result"] == ("1-0" if a_color == "w" else "0-1"):
+        summary["wins"] += 1
+    else:
+        summary["losses"] += 1
+    summary["reasons"][game["reason"]] = summary["reasons"].get(game["reason"], 0) + 1
+    for engine, color in (("a", a_color), ("b", b_color)):
+        for key in ("nodes", "seconds", "moves"):
+            summary[engine][key] += game["stats"][color][key]
+
+'''
+elo difference of engine a over engine b and the half width of its 95% confidence interval,
+from the score and its standard error over the games. None when one side scored everything
+'''
+def elo_difference(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return None, None
+    score = (wins + draws / 2) / games
+    if score <= 0 or score >= 1:
+        return None, None
+    variance = (wins * (1 - score)**2 + draws * (0.5 - score)**2 + losses * score**2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    low, high = max(score - margin, 1e-6), min(score + margin, 1 - 1e-6)
+    elo = score_to_elo(score)
+    return elo, (score_to_elo(high) - score_to_elo(low)) / 2
+
+def score_to_elo(score):
+    return -400 * math.log10(1 / score - 1)
+
+def format_summary(engine_a, engine_b, summary):
+    games = summary["wins"] + summary["draws"] + summary["losses"]
+    lines = [engine_a["name"] + " vs " + engine_b["name"] + ": +" + str(summary["wins"]) + " =" + str(summary["draws"]) +
+             " -" + str(summary["losses"]) + " in " + str(games) + " games"]
+    elo, margin = elo_difference(summary["wins"], summary["draws"], summary["losses"])
+    if elo is None:
+        lines.append("elo difference: can't tell, one side scored everything")
+    else:
+        lines.append("elo difference: " + str(round(elo)) + " +/- " + str(round(margin)))
+    lines.append("ended by: " + ", ".join(reason + " " + str(count) for reason, count in sorted(summary["reasons"].items())))
+    for key, engine in (("a", engine_a), ("b", engine_b)):
+        stats = summary[key]
+        nps = int(stats["nodes"] / stats["seconds"]) if stats["seconds"] > 0 else 0
+        per_move = stats["seconds"] / stats["moves"] if stats["moves"] > 0 else 0.0
+        lines.append(engine["name"] + ": " + str(nps) + " nodes/s, " + str(round(per_move * 1000, 1)) + " ms per move")
+    return "\n".join(lines)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "play a match between two engine variants")
+    parser.add_argument("engine_a")
+    parser.add_argument("engine_b")
+    parser.add_argument("--games", type = int, default = 100)
+    parser.add_argument("--workers", type = int, default = 0, help = "game processes, 0 for one per core")
+    parser.add_argument("--opening-plies", type = int, default = OPENING_PLIES)
+    parser.add_argument("--max-plies", type = int, default = MAX_PLIES)
+    parser.add_argument("--seed", type = int, default = 1)
+    parser.add_argument("--quiet", action = "store_true", help = "only print the final report")
+    args = parser.parse_args(argv)
+    engine_a = parse_engine(args.engine_a)
+    engine_b = parse_engine(args.engine_b)
+
+    def print_game(game, summary):
+        if not args.quiet:
+            print("game " + str(summary["wins"] + summary["draws"] + summary["losses"]) + ": " + game["result"] + " " +
+                  game["reason"] + " after " + str(game["plies"]) + " plies (" + ("b" if game["swapped"] else "a") +
+                  " white), +" + str(summary["wins"]) + " =" + str(summary["draws"]) + " -" + str(summary["losses"]), flush = True)
+
+    summary = run_match(engine_a, engine_b, args.games, args.workers, args.opening_plies, args.max_plies, args.seed, print_game)
+    print(format_summary(engine_a, engine_b, summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
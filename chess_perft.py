@@ -0,0 +1,166 @@
+'''
+Perft - count every leaf of the move tree to a fixed depth.
+Comparing against the known counts for standard test positions checks the move generator,
+timing it gives nodes per second to benchmark any change to it.
+
+python chess_perft.py 4                                  start position to depth 4
+python chess_perft.py 3 --fen "<fen>" --divide           count under each root move
+python chess_perft.py --suite                            every test position
+python chess_perft.py --suite --mailbox                  same with the 8x8 list game_state
+python chess_perft.py --make-undo                        time make_move + undo_move on their own
+'''
+import argparse
+import sys
+import time
+import chess_engine, chess_bitboard
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# (what it tests, fen, {depth: leaf nodes})
+PERFT_SUITE = [
+    ("start position", START_FEN,
+        {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete, castling and pins", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("en passant and rook pins", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("promotions and checks", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("promotion with capture", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("symmetrical middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    ("illegal en passant along a rank", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {6: 1134888}),
+    ("illegal en passant along a diagonal", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {6: 1015133}),
+    ("en passant gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {6: 1440467}),
+    ("short castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", {6: 661072}),
+    ("long castling gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {6: 803711}),
+    ("castling rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {4: 1274206}),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {4: 1720476}),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", {6: 3821001}),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", {5: 1004658}),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", {6: 217342}),
+    ("underpromote to check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", {6: 92683}),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", {6: 2217}),
+    ("stalemate and checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", {7: 567584}),
+    ("double check", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {4: 23527}),
+]
+
+
+def new_game_state(fen = START_FEN, mailbox = False):
+    gs = chess_engine.game_state() if mailbox else chess_bitboard.bitboard_state()
+    gs.load_fen(fen)
+    return gs
+
+'''
+number of leaf nodes depth plies down, the last ply is counted without being played
+'''
+def perft(gs, depth):
+    moves = gs.get_valid_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+# perft split up by root move, to narrow down which move a wrong count comes from
+def divide(gs, depth):
+    counts = []
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        counts.append((move.get_chess_notation(), perft(gs, depth - 1)))
+        gs.undo_move()
+    return counts
+
+def timed_perft(gs, depth):
+    start = time.perf_counter()
+    nodes = perft(gs, depth)
+    return nodes, time.perf_counter() - start
+
+def nodes_per_second(nodes, seconds):
+    return int(nodes / seconds) if seconds > 0 else 0
+
+'''
+run every suite position at every depth whose count is at most max_nodes,
+print a line per run and return True if they all matched
+'''
+def run_suite(mailbox = False, max_nodes = 1000000):
+    failures = 0
+    total_nodes = 0
+    total_seconds = 0.0
+    for name, fen, expected in PERFT_SUITE:
+        for depth, count in sorted(expected.items()):
+            if count > max_nodes:
+                continue
+            nodes, seconds = timed_perft(new_game_state(fen, mailbox), depth)
+            total_nodes += nodes
+            total_seconds += seconds
+            status = "ok  " if nodes == count else "FAIL"
+            if nodes != count:
+                failures += 1
+            print(status + " " + name + ", depth " + str(depth) + ": " + str(nodes) + " (expected " + str(count) + "), " +
+                  str(nodes_per_second(nodes, seconds)) + " nodes/s")
+    print(str(total_nodes) + " nodes in " + str(round(total_seconds, 2)) + "s, " +
+          str(nodes_per_second(total_nodes, total_seconds)) + " nodes/s, " + str(failures) + " failed")
+    return failures == 0
+
+'''
+time a make_move + undo_move pair on its own, without generating moves, over every legal move
+of every suite position. returns (pairs played, seconds)
+'''
+def make_undo_benchmark(mailbox = False, repeats = 200):
+    positions = []
+    for name, fen, expected in PERFT_SUITE:
+        gs = new_game_state(fen, mailbox)
+        positions.append((gs, gs.get_valid_moves()))
+    pairs = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for gs, moves in positions:
+            for move in moves:
+                gs.make_move(move)
+                gs.undo_move()
+            pairs += len(moves)
+    return pairs, time.perf_counter() - start
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "perft move generator test and benchmark")
+    parser.add_argument("depth", type = int, nargs = "?", default = 4)
+    parser.add_argument("--fen", default = START_FEN)
+    parser.add_argument("--divide", action = "store_true", help = "show the count under every root move")
+    parser.add_argument("--suite", action = "store_true", help = "run all the known test positions")
+    parser.add_argument("--max-nodes", type = int, default = 1000000, help = "skip suite runs bigger than this")
+    parser.add_argument("--mailbox", action = "store_true", help = "use the 8x8 list game_state instead of bitboards")
+    parser.add_argument("--make-undo", action = "store_true", help = "benchmark make_move + undo_move instead of perft")
+    args = parser.parse_args(argv)
+
+    if args.make_undo:
+        pairs, seconds = make_undo_benchmark(args.mailbox)
+        print(str(pairs) + " make/undo pairs in " + str(round(seconds, 2)) + "s, " +
+              str(round(seconds / pairs * 1e6, 2)) + " us per pair")
+        return 0
+
+    if args.suite:
+        return 0 if run_suite(args.mailbox, args.max_nodes) else 1
+    gs = new_game_state(args.fen, args.mailbox)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(gs, args.depth)
+        for notation, count in counts:
+            print(notation + ": " + str(count))
+        nodes = sum(count for notation, count in counts)
+        print(str(len(counts)) + " moves")
+    else:
+        nodes = perft(gs, args.depth)
+    seconds = time.perf_counter() - start
+    print("depth " + str(args.depth) + ": " + str(nodes) + " nodes in " + str(round(seconds, 2)) + "s, " +
+          str(nodes_per_second(nodes, seconds)) + " nodes/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+'''
+PGN reading and writing. The reader streams game collections of any size a game at a time,
+skipping comments, variations and annotation glyphs, and resolves the SAN moves against
+get_valid_moves. The writer turns a game_state's move_log back into PGN with full SAN:
+disambiguation (Nbd7, R1e2), promotions (e8=Q) and check or mate (+, #).
+
+    for headers, gs, error in chess_pgn.replay_games(open("games.pgn")):
+        ... # gs has every move of the game in its move_log, error says why if a move was bad
+    chess_pgn.write_game(output, gs, {"White": "me", "Result": "1-0"})
+
+python chess_pgn.py bench games.pgn                 games per second reading and replaying
+python chess_pgn.py bench games.pgn -o out.pgn      and writing every game back out
+python chess_pgn.py check                           replay the awkward games in CHECK_GAMES
+'''
+import argparse
+import re
+import sys
+import time
+import chess_engine
+
+TAG = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+# piece, from file, from rank, to square, promotion - once the check and annotation marks are gone
+SAN = re.compile(r"^([KQRBN])?([a-h])?([1-8])?[x-]?([a-h][1-8])(?:=?([QRBNqrbn]))?$")
+SEVEN_TAGS = ("Event", "Site", "Date", "Round", "White", "Black", "Result") # written first, in this order
+SETUP_TAGS = ("SetUp", "FEN") # then these if the game has them, then the rest alphabetically
+LINE_LENGTH = 80
+# (PGN, Event, plies, result) games that trip up a careless reader: ; comments mid game, comments over
+# several lines, ; and { inside comments and tag values, nested variations, glyphs, a result inside a
+# comment and results only in the movetext
+CHECK_GAMES = (
+    ('[Event "rest of line comment"]\n\n1. e4 e5 ; the open game {\n2. Nf3 Nc6 3. Bb5 ; the Ruy Lopez\na6 1-0\n',
+     "rest of line comment", 6, "1-0"),
+    ('[Event "comment lines"]\n\n1. d4 {a comment ; still in it\nover two lines 1-0} d5 2. c4 ; gambit\n; a whole line\ne6 *\n',
+     "comment lines", 4, "*"),
+    ('[Event "variations"]\n\n1. e4 (1. d4 d5 (1... Nf6 2. c4) 2. c4) 1... c5 $1 2. Nf3!? d6 1/2-1/2\n', "variations", 4, "1/2-1/2"),
+    ('[Event "Ch; round {1"]\n[Site "a {b} ; c"]\n[Result "0-1"]\n\n1. f3 e5 2. g4 Qh4# 0-1\n', "Ch; round {1", 4, "0-1"),
+)
+
+
+def new_game_state(fen = None):
+    gs = chess_engine.game_state()
+    if fen is not None:
+        gs.load_fen(fen)
+    return gs
+
+'''
+yields (headers, moves) for every game in the lines of a PGN file, headers is a dict of the tags
+(Result from the end of the movetext if there's no tag) and moves a list of SAN strings. reads one game at a time so any size of file is fine
+'''
+def read_games(lines):
+    headers = {}
+    movetext = []
+    in_comment = False # inside a { } comment that runs on past the end of a line
+    for line in lines:
+        line = line.strip()
+        if line.startswith("%"): # escaped line
+            continue
+        tag = TAG.match(line) if not in_comment else None # a tag value can hold ; and {
+        if tag is not None:
+            if movetext: # tags straight after movetext start the next game
+                yield game_moves(headers, movetext)
+                headers = {}
+                movetext = []
+            headers[tag.group(1)] = tag.group(2).replace('\\"', '"').replace("\\\\", "\\")
+            continue
+        line, in_comment = strip_rest_of_line_comment(line, in_comment)
+        if line:
+            movetext.append(line)
+            if line.split()[-1] in RESULTS and not line.endswith("}") and not in_comment:
+                yield game_moves(headers, movetext)
+                headers = {}
+                movetext = []
+    if headers or movetext:
+        yield game_moves(headers, movetext)
+
+# (headers, moves) for a game's movetext lines, a result at the end stands in for a missing Result tag
+def game_moves(headers, movetext):
+    text = " ".join(movetext)
+    tokens = text.split()
+    if tokens and tokens[-1] in RESULTS:
+        headers.setdefault("Result", tokens[-1])
+    return headers, movetext_moves(text)
+
+'''
+the line without a ; comment, which runs to the end of the line. a ; inside a { } comment
+doesn't start one, so whether the line starts inside a brace comment is passed in, and
+whether it ends inside one is returned with the line
+'''
+def strip_rest_of_line_comment(line, in_comment):
+    for i, char in enumerate(line):
+        if in_comment:
+            if char == "}":
+                in_comment = False
+        elif char == "{":
+            in_comment = True
+        elif char == ";":
+            return line[:i].rstrip(), in_comment
+    return line, in_comment
+
+# the SAN moves of the main line, without comments, variations, NAGs, move numbers or the result
+def movetext_moves(text):
+    moves = []
+    depth = 0 # inside this many variations
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "{": # comment runs to the closing brace
+            end = text.find("}", i)
+            i = len(text) if end == -1 else end + 1
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif not char.isspace():
+            end = i
+            while end < len(text) and not text[end].isspace() and text[end] not in "{}();":
+                end += 1
+            token = MOVE_NUMBER.sub("", text[i:end])
+            if depth == 0 and token and token not in RESULTS and not token.startswith("$"):
+                moves.append(token)
+            i = end
+            continue
+        i += 1
+    return moves
+
+'''
+the legal move a SAN string like "Nbd7", "exd5", "e8=Q+" or "O-O" stands for.
+raises ValueError if it matches no legal move, or more than one
+'''
+def move_from_san(gs, san, valid_moves = None):
+    if valid_moves is None:
+        valid_moves = gs.get_valid_moves()
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(text) == 3 else 2
+        for move in valid_moves:
+            if move.is_castle_move and move.end_col == end_col:
+                return move
+        raise ValueError("illegal castling: " + san)
+    parts = SAN.match(text)
+    if parts is None:
+        raise ValueError("can't read move: " + san)
+    piece, from_file, from_rank, to_square, promotion_piece = parts.groups()
+    piece = piece or "p"
+    end_row = 8 - int(to_square[1])
+    end_col = ord(to_square[0]) - ord("a")
+    start_col = ord(from_file) - ord("a") if from_file is not None else None
+    start_row = 8 - int(from_rank) if from_rank is not None else None
+    promotion_piece = promotion_piece.upper() if promotion_piece is not None else "Q"
+    match = None
+    for move in valid_moves:
+        if move.end_row == end_row and move.end_col == end_col and move.piece_moved[1] == piece and \
+            (start_col is None or move.start_col == start_col) and (start_row is None or move.start_row == start_row) and \
+            (not move.is_pawn_promotion or move.promotion_piece == promotion_piece):
+            if match is not None:
+                raise ValueError("ambiguous move: " + san)
+            match = move
+    if match is None:
+        raise ValueError("illegal move: " + san)
+    return match
+
+# SAN without the check mark: str(move) plus the start file, rank or square when another piece of the same kind could go there too
+def san_without_check(move, valid_moves):
+    san = str(move)
+    if move.piece_moved[1] in "pK":
+        return san
+    rivals = [other for other in valid_moves if other.piece_moved == move.piece_moved and other.end_row == move.end_row and
+              other.end_col == move.end_col and (other.start_row != move.start_row or other.start_col != move.start_col)]
+    if not rivals:
+        return san
+    if all(other.start_col != move.start_col for other in rivals):
+        from_square = move.cols_to_files[move.start_col]
+    elif all(other.start_row != move.start_row for other in rivals):
+        from_square = move.rows_to_ranks[move.start_row]
+    else:
+        from_square = move.get_rank_file(move.start_row, move.start_col)
+    return san[0] + from_square + san[1:]
+
+# "+", "#" or nothing, for the position a move has just been played into and its valid moves
+def check_mark(gs, valid_moves):
+    if not gs.in_check:
+        return ""
+    return "#" if len(valid_moves) == 0 else "+"
+
+'''
+full SAN for a legal move in the position it's about to be played from. valid_moves are that
+position's moves if they're already generated, the move is made and undone to look for check
+'''
+def move_to_san(gs, move, valid_moves = None):
+    if valid_moves is None:
+        valid_moves = gs.get_valid_moves()
+    san = san_without_check(move, valid_moves)
+    gs.make_move(move)
+    san += check_mark(gs, gs.get_valid_moves())
+    gs.undo_move()
+    return san
+
+'''
+SAN for every move in gs.move_log. the moves are taken back and played again, one move
+generation per ply, so gs ends up as it was
+'''
+def san_moves(gs):
+    played = list(gs.move_log)
+    for _ in played:
+        gs.undo_move()
+    sans = []
+    valid_moves = gs.get_valid_moves()
+    for move in played:
+        san = san_without_check(move, valid_moves)
+        gs.make_move(move)
+        valid_moves = gs.get_valid_moves()
+        sans.append(san + check_mark(gs, valid_moves))
+    return sans
+
+'''
+yields (headers, gs, error) for every game in the lines of a PGN file, with the game played
+into gs. error is None, or why the game stopped early if it has a move that can't be played
+'''
+def replay_games(lines):
+    for headers, moves in read_games(lines):
+        error = None
+        try:
+            gs = new_game_state(headers.get("FEN"))
+        except (ValueError, KeyError, IndexError):
+            yield headers, new_game_state(), "bad FEN: " + headers.get("FEN", "")
+            continue
+        try:
+            valid_moves = gs.get_valid_moves()
+            for san in moves:
+                gs.make_move(move_from_san(gs, san, valid_moves))
+                valid_moves = gs.get_valid_moves()
+        except ValueError as bad_move:
+            error = str(bad_move)
+        yield headers, gs, error
+
+
+'''
+the game in gs as PGN text. headers go out with the seven tag roster first, a game that
+didn't start from the normal position gets SetUp and FEN tags
+'''
+def game_pgn(gs, headers = None):
+    headers = dict(headers or {})
+    sans = san_moves(gs)
+    played = list(gs.move_log)
+    for _ in played: # the starting position and move number
+        gs.undo_move()
+    start_fen = gs.get_fen()
+    white_first = gs.white_to_move
+    move_number = gs.fullmove_number
+    for move in played:
+        gs.make_move(move)
+    if start_fen != new_game_state().get_fen():
+        headers.setdefault("SetUp", "1")
+        headers.setdefault("FEN", start_fen)
+    result = headers.setdefault("Result", "*")
+    lines = []
+    tags = list(SEVEN_TAGS) + [tag for tag in SETUP_TAGS if tag in headers]
+    for tag in tags + sorted(tag for tag in headers if tag not in tags):
+        value = headers.get(tag, "?")
+        lines.append("[" + tag + " \"" + value.replace("\\", "\\\\").replace('"', '\\"') + "\"]")
+    lines.append("")
+    tokens = []
+    for i, san in enumerate(sans):
+        white_move = (i % 2 == 0) == white_first
+        if white_move:
+            tokens.append(str(move_number) + ".")
+        elif i == 0:
+            tokens.append(str(move_number) + "...")
+        tokens.append(san)
+        if not white_move:
+            move_number += 1
+    tokens.append(result)
+    line = ""
+    for token in tokens: # movetext wrapped at LINE_LENGTH
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+def write_game(output, gs, headers = None):
+    output.write(game_pgn(gs, headers))
+
+
+'''
+read and replay every game in the files, optionally writing each back out, and report
+games and plies per second. returns (games, plies, bad games, seconds)
+'''
+def benchmark(pgn_paths, output = None, limit = None):
+    games = plies = bad = 0
+    start = time.perf_counter()
+    for path in pgn_paths:
+        with open(path, encoding = "utf-8", errors = "replace") as pgn_file:
+            for headers, gs, error in replay_games(pgn_file):
+                games += 1
+                plies += len(gs.move_log)
+                if error is not None:
+                    bad += 1
+                elif output is not None:
+                    write_game(output, gs, headers)
+                if limit is not None and games >= limit:
+                    break
+        if limit is not None and games >= limit:
+            break
+    return games, plies, bad, time.perf_counter() - start
+
+# replay every game in CHECK_GAMES, returns the number that came out wrong
+def check_games():
+    failed = 0
+    for pgn, event, plies, result in CHECK_GAMES:
+        games = list(replay_games(pgn.splitlines()))
+        headers, gs, error = games[0]
+        written = game_pgn(gs, headers).split()[-1] # the result the writer puts after the moves
+        ok = len(games) == 1 and error is None and headers.get("Event") == event and len(gs.move_log) == plies and written == result
+        if not ok:
+            failed += 1
+        print(("ok   " if ok else "FAIL ") + event + ": " + str(len(games)) + " games, Event " + str(headers.get("Event")) + ", " +
+              str(len(gs.move_log)) + " plies, result " + written + ", expected " + str(plies) + " plies and " + result +
+              ("" if error is None else ", " + error))
+    return failed
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "benchmark reading, replaying and writing PGN")
+    parser.add_argument("command", choices = ("bench", "check"))
+    parser.add_argument("pgn", nargs = "*")
+    parser.add_argument("-o", "--output", default = None, help = "write the replayed games to this PGN file")
+    parser.add_argument("--limit", type = int, default = None, help = "stop after this many games")
+    args = parser.parse_args(argv)
+    if args.command == "check":
+        return 0 if check_games() == 0 else 1
+    if not args.pgn:
+        parser.error("bench needs at least one PGN file")
+
+    output = open(args.output, "w", encoding = "utf-8") if args.output is not None else None
+    games, plies, bad, seconds = benchmark(args.pgn, output, args.limit)
+    if output is not None:
+        output.close()
+    print(str(games) + " games (" + str(bad) + " with bad moves), " + str(plies) + " plies in " + str(round(seconds, 2)) + "s")
+    if seconds > 0:
+        print(str(round(games / seconds, 1)) + " games/s, " + str(int(plies / seconds)) + " plies/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+'''
+Endgame tablebases for king and one piece against a lone king: KQK, KRK and KPK.
+Every position is solved by retrograde analysis - start from the checkmates and work backwards
+one ply at a time - and written out as a distance to mate file (one byte per position) and a
+win/draw/loss file (2 bits per position). Probing is an index calculation and one byte read.
+
+Positions are always stored with white as the side with the piece, a position where black has it
+is flipped top to bottom with the colors swapped first. The index is
+white king square << 12 | black king square << 6 | piece square (row*8 + col), white to move
+positions come first and black to move positions after them.
+
+python chess_tablebase.py generate                 all of them into tablebases/
+python chess_tablebase.py probe --fen "<fen>"
+'''
+import argparse
+import mmap
+import os
+import sys
+import time
+import chess_engine
+
+ENDINGS = ("KQK", "KRK", "KPK") # KPK promotes into the others, so it's generated last
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+MAGIC = b"CSTB1\0\0\0"
+POSITIONS = 64 * 64 * 64 # per side to move
+
+# dtm byte: 0 is a draw, 255 is a position that can't happen, anything else is mate in (byte - 1) plies.
+# white to move positions are won for white, black to move positions are lost for black
+DRAW = 0
+ILLEGAL = 255
+# wdl values, from the side to move's point of view
+WDL_DRAW = 0
+WDL_WIN = 1
+WDL_LOSS = 2
+WDL_ILLEGAL = 3
+
+KING_TARGETS = [[(r + dr)*8 + c + dc for dr, dc in chess_engine.DIRECTIONS if 0 <= r + dr < 8 and 0 <= c + dc < 8]
+                for r in range(8) for c in range(8)]
+ADJACENT = [[b in KING_TARGETS[a] for b in range(64)] for a in range(64)]
+# squares from sq out along each of chess_engine.DIRECTIONS
+RAYS = [[[r*8 + c for r, c in ray] for ray in rays] for rays in chess_engine.RAY_SQUARES]
+PAWN_ATTACKS = [[r*8 + c for r, c in squares] for squares in chess_engine.PAWN_ATTACK_SQUARES["w"]]
+PIECE_DIRECTIONS = {"Q": range(0,8), "R": range(0,4)}
+
+def index(white_king, black_king, piece):
+    return white_king << 12 | black_king << 6 | piece
+
+# does the white piece on square piece attack target, with the white king as the only blocker
+def piece_attacks(kind, piece, target, white_king):
+    if kind == "P":
+        return target in PAWN_ATTACKS[piece]
+    for d in PIECE_DIRECTIONS[kind]:
+        for sq in RAYS[piece][d]:
+            if sq == target:
+                return True
+            if sq == white_king:
+                break
+    return False
+
+def legal_placement(kind, white_king, black_king, piece):
+    if white_king == black_king or piece == white_king or piece == black_king or ADJACENT[white_king][black_king]:
+        return False
+    return kind != "P" or 1 <= piece >> 3 <= 6
+
+def legal_white_to_move(kind, white_king, black_king, piece):
+    return legal_placement(kind, white_king, black_king, piece) and not piece_attacks(kind, piece, black_king, white_king)
+
+# black's king moves, the piece is captured if it steps onto it
+def black_moves(kind, white_king, black_king, piece):
+    moves = []
+    for sq in KING_TARGETS[black_king]:
+        if sq == white_king or ADJACENT[white_king][sq]:
+            continue
+        if sq != piece and piece_attacks(kind, piece, sq, white_king):
+            continue
+        moves.append(sq)
+    return moves
+
+# white to move positions that lead to (white_king, black_king, piece) with black to move
+def white_unmoves(kind, white_king, black_king, piece):
+    positions = []
+    for sq in KING_TARGETS[white_king]:
+        if sq != black_king and sq != piece and not ADJACENT[sq][black_king] and legal_white_to_move(kind, sq, black_king, piece):
+            positions.append(index(sq, black_king, piece))
+    if kind == "P": # one square back, or two from the starting row
+        row = piece >> 3
+        if row <= 5 and piece + 8 != white_king and piece + 8 != black_king:
+            if legal_white_to_move(kind, white_king, black_king, piece + 8):
+                positions.append(index(white_king, black_king, piece + 8))
+            if row == 4 and piece + 16 != white_king and piece + 16 != black_king and \
+                legal_white_to_move(kind, white_king, black_king, piece + 16):
+                positions.append(index(white_king, black_king, piece + 16))
+        return positions
+    for d in PIECE_DIRECTIONS[kind]:
+        for sq in RAYS[piece][d]:
+            if sq == white_king or sq == black_king:
+                break
+            if legal_white_to_move(kind, white_king, black_king, sq):
+                positions.append(index(white_king, black_king, sq))
+    return positions
+
+'''
+solve every position of one ending, returns (white to move dtm, black to move dtm) bytearrays.
+promotions need the KQK and KRK results, passed in as {"KQK": (white, black), ...}
+'''
+def generate(ending, solved = None):
+    kind = ending[1]
+    white_dtm = bytearray([ILLEGAL]) * POSITIONS
+    black_dtm = bytearray([ILLEGAL]) * POSITIONS
+    escapes = [0] * POSITIONS # black moves from each black to move position not yet known to lose
+    buckets = [[]] # buckets[n] are the positions first solved as mate in n plies, (white to move, index)
+    for white_king in range(64):
+        for black_king in range(64):
+            for piece in range(64):
+                if not legal_placement(kind, white_king, black_king, piece):
+                    continue
+                i = index(white_king, black_king, piece)
+                black_dtm[i] = DRAW
+                if not piece_attacks(kind, piece, black_king, white_king):
+                    white_dtm[i] = DRAW
+                moves = black_moves(kind, white_king, black_king, piece)
+                escapes[i] = len(moves)
+                if piece in moves: # taking the piece is a draw, this position can never be lost
+                    escapes[i] = -1
+                if not moves and piece_attacks(kind, piece, black_king, white_king): # checkmate
+                    black_dtm[i] = 1
+                    buckets[0].append((False, i))
+    if kind == "P": # promoting wins if the queen or rook position is a win
+        for i in range(POSITIONS):
+            white_king, black_king, piece = i >> 12, (i >> 6) & 63, i & 63
+            if white_dtm[i] == ILLEGAL or piece >> 3 != 1 or piece - 8 == white_king or piece - 8 == black_king:
+                continue
+            best = None
+            for promoted in ("KQK", "KRK"):
+                dtm = solved[promoted][1][index(white_king, black_king, piece - 8)]
+                if dtm != DRAW and dtm != ILLEGAL and (best is None or dtm < best):
+                    best = dtm
+            if best is not None: # mate in best - 1 after promoting, so best plies from here
+                while len(buckets) <= best:
+                    buckets.append([])
+                buckets[best].append((True, i))
+    plies = 0
+    while plies < len(buckets):
+        for white_to_move, i in buckets[plies]:
+            white_king, black_king, piece = i >> 12, (i >> 6) & 63, i & 63
+            if white_to_move:
+                if white_dtm[i] != DRAW: # already won faster
+                    continue
+                white_dtm[i] = plies + 1
+                # every black move into here is one less way out for black
+                for sq in KING_TARGETS[black_king]:
+                    if sq == white_king or sq == piece or ADJACENT[sq][white_king]:
+                        continue
+                    previous = index(white_king, sq, piece)
+                    if escapes[previous] > 0:
+                        escapes[previous] -= 1
+                        if escapes[previous] == 0:
+                            while len(buckets) <= plies + 1:
+                                buckets.append([])
+                            buckets[plies + 1].append((False, previous))
+            else:
+                if black_dtm[i] == DRAW:
+                    black_dtm[i] = plies + 1
+                for previous in white_unmoves(kind, white_king, black_king, piece):
+                    if white_dtm[previous] == DRAW:
+                        while len(buckets) <= plies + 1:
+                            buckets.append([])
+                        buckets[plies + 1].append((True, previous))
+        plies += 1
+    return white_dtm, black_dtm
+
+def wdl_bytes(white_dtm, black_dtm):
+    values = bytearray(POSITIONS // 2)
+    for table, win in ((white_dtm, WDL_WIN), (black_dtm, WDL_LOSS)):
+        offset = 0 if table is white_dtm else POSITIONS
+        for i in range(POSITIONS):
+            dtm = table[i]
+            value = WDL_ILLEGAL if dtm == ILLEGAL else (WDL_DRAW if dtm == DRAW else win)
+            position = offset + i
+            values[position >> 2] |= value << ((position & 3) * 2)
+    return values
+
+def write_tables(ending, white_dtm, black_dtm, directory = TABLEBASE_DIR):
+    os.makedirs(directory, exist_ok = True)
+    with open(os.path.join(directory, ending + ".dtm"), "wb") as dtm_file:
+        dtm_file.write(MAGIC + white_dtm + black_dtm)
+    with open(os.path.join(directory, ending + ".wdl"), "wb") as wdl_file:
+        wdl_file.write(MAGIC + wdl_bytes(white_dtm, black_dtm))
+
+def read_dtm(ending, directory = TABLEBASE_DIR):
+    with open(os.path.join(directory, ending + ".dtm"), "rb") as dtm_file:
+        data = dtm_file.read()
+    return data[len(MAGIC):len(MAGIC) + POSITIONS], data[len(MAGIC) + POSITIONS:]
+
+def generate_all(endings = ENDINGS, directory = TABLEBASE_DIR, verbose = True):
+    solved = {}
+    for ending in endings:
+        if ending == "KPK":
+            for promoted in ("KQK", "KRK"):
+                if promoted not in solved:
+                    solved[promoted] = read_dtm(promoted, directory)
+        start = time.perf_counter()
+        solved[ending] = generate(ending, solved)
+        write_tables(ending, *solved[ending], directory = directory)
+        if verbose:
+            longest = max(dtm for dtm in solved[ending][0] if dtm != ILLEGAL) - 1
+            print(ending + " solved in " + str(round(time.perf_counter() - start, 1)) + "s, longest mate " + str(longest) + " plies")
+    return solved
+
+
+'''
+the tables for probing from the search, memory mapped so only the pages that get used are read.
+an ending uses its .dtm file if it's there and falls back on the .wdl file, which has no distances
+'''
+class tablebases():
+    def __init__(self, directory = TABLEBASE_DIR):
+        self.directory = directory
+        self.files = []
+        self.dtm = {}
+        self.wdl = {}
+        for ending in ENDINGS:
+            for extension, tables in (("dtm", self.dtm), ("wdl", self.wdl)):
+                path = os.path.join(directory, ending + "." + extension)
+                if os.path.exists(path):
+                    table_file = open(path, "rb")
+                    data = mmap.mmap(table_file.fileno(), 0, access = mmap.ACCESS_READ)
+                    self.files.append((table_file, data))
+                    if data[:len(MAGIC)] != MAGIC:
+                        self.close()
+                        raise ValueError("not a tablebase file: " + path)
+                    tables[ending[1]] = data
+        self.pieces = 3 if self.dtm or self.wdl else 0 # most pieces on the board a probe can answer
+
+    def close(self):
+        for table_file, data in self.files:
+            data.close()
+            table_file.close()
+
+    '''
+    (wdl, dtm) for the side to move, dtm is plies to mate (None from a .wdl file) and wdl one of
+    WDL_WIN, WDL_DRAW, WDL_LOSS. None if the position isn't covered
+    '''
+    def probe(self, gs):
+        if gs.piece_count != 3 or gs.castling_rights:
+            return None
+        piece = None
+        piece_sq = 0
+        for r in range(8):
+            for c in range(8):
+                square = gs.board[r][c]
+                if square != "--" and square[1] != "K":
+                    piece = square
+                    piece_sq = r*8 + c
+        if piece is None:
+            return None
+        kind = piece[1].upper() # pawns are "p" on the board
+        if kind not in self.dtm and kind not in self.wdl:
+            return None
+        white_king = gs.white_king_location[0]*8 + gs.white_king_location[1]
+        black_king = gs.black_king_location[0]*8 + gs.black_king_location[1]
+        white_to_move = gs.white_to_move
+        if piece[0] == "b": # flip so the piece is white
+            white_king, black_king, piece_sq = black_king ^ 56, white_king ^ 56, piece_sq ^ 56
+            white_to_move = not white_to_move
+        i = index(white_king, black_king, piece_sq) + (0 if white_to_move else POSITIONS)
+        if kind in self.dtm:
+            dtm = self.dtm[kind][len(MAGIC) + i]
+            if dtm == ILLEGAL:
+                return None
+            if dtm == DRAW:
+                return WDL_DRAW, None
+            return (WDL_WIN if white_to_move else WDL_LOSS), dtm - 1
+        wdl = (self.wdl[kind][len(MAGIC) + (i >> 2)] >> ((i & 3) * 2)) & 3
+        return (None if wdl == WDL_ILLEGAL else (wdl, None))
+
+# the tables in TABLEBASE_DIR if they've been generated, None otherwise
+def open_default_tablebases():
+    tables = tablebases()
+    if tables.pieces == 0:
+        return None
+    return tables
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "generate or probe the KQK, KRK and KPK tablebases")
+    parser.add_argument("command", choices = ("generate", "probe"))
+    parser.add_argument("endings", nargs = "*", default = list(ENDINGS))
+    parser.add_argument("--dir", default = TABLEBASE_DIR)
+    parser.add_argument("--fen", default = None)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate_all([ending for ending in ENDINGS if ending in args.endings], args.dir)
+        return 0
+    gs = chess_engine.game_state()
+    gs.load_fen(args.fen)
+    tables = tablebases(args.dir)
+    result = tables.probe(gs)
+    if result is None:
+        print("not in the tablebases")
+    else:
+        wdl, dtm = result
+        print({WDL_WIN: "win", WDL_DRAW: "draw", WDL_LOSS: "loss"}[wdl] + ("" if dtm is None else ", mate in " + str(dtm) + " plies"))
+    tables.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
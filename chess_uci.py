@@ -0,0 +1,182 @@
+'''
+UCI protocol front end, so the engine can be run by tournament managers and chess GUIs.
+Reads commands on stdin and answers on stdout, the search runs in its own thread so
+"stop" and "isready" are answered while it thinks. After "go infinite" or "go ponder" the
+bestmove is held back until "stop" or "ponderhit", even if the search ends first.
+
+python chess_uci.py
+'''
+import sys
+import threading
+import time
+import chess_ai, chess_book, chess_headless, chess_tablebase
+
+ENGINE_NAME = "csthomps Chess"
+ENGINE_AUTHOR = "csthomps"
+MOVE_OVERHEAD = 0.05 # seconds kept back from every time limit for talking to the GUI
+
+
+class uci_engine():
+    def __init__(self, output = sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.gs = chess_headless.new_game_state()
+        self.book = chess_book.open_default_book()
+        self.tablebase = chess_tablebase.open_default_tablebases()
+        self.searcher = chess_ai.searcher(book = self.book, tablebase = self.tablebase)
+        self.search_thread = None
+        self.bestmove_allowed = threading.Event() # cleared while an infinite or ponder search must not answer yet
+        self.ponder_time_limit = None # the time budget of a ponder search, it starts on ponderhit
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    '''
+    handle one line of input, returns False once it's time to quit
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if len(tokens) == 0:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            self.searcher = chess_ai.searcher(book = self.book, tablebase = self.tablebase)
+            self.gs = chess_headless.new_game_state()
+        elif command == "position":
+            self.stop()
+            try:
+                self.set_position(tokens[1:])
+            except ValueError as error: # keep the old position, the GUI hears why
+                self.send("info string bad position: " + str(error))
+        elif command == "go":
+            self.stop()
+            self.go(tokens[1:])
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+    # position startpos [moves ...] or position fen <6 fields> [moves ...]
+    def set_position(self, tokens):
+        if "moves" in tokens:
+            moves = tokens[tokens.index("moves") + 1:]
+            tokens = tokens[:tokens.index("moves")]
+        else:
+            moves = []
+        fen = " ".join(tokens[1:]) if len(tokens) > 0 and tokens[0] == "fen" else None
+        gs = chess_headless.new_game_state(fen)
+        chess_headless.play_moves(gs, moves)
+        self.gs = gs
+
+    '''
+    turn the go arguments into a depth, node and time budget and start searching
+    '''
+    def go(self, tokens):
+        options = {}
+        i = 0
+        while i < len(tokens):
+            if tokens[i] in ("infinite", "ponder"):
+                options[tokens[i]] = True
+                i += 1
+            elif i + 1 < len(tokens):
+                try:
+                    options[tokens[i]] = int(tokens[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                i += 1
+        time_limit = None
+        if "movetime" in options:
+            time_limit = options["movetime"] / 1000
+        elif ("wtime" if self.gs.white_to_move else "btime") in options:
+            remaining = options["wtime" if self.gs.white_to_move else "btime"] / 1000
+            increment = options.get("winc" if self.gs.white_to_move else "binc", 0) / 1000
+            moves_to_go = options.get("movestogo", 30)
+            time_limit = min(remaining / moves_to_go + increment * 0.8, remaining / 2)
+        if time_limit is not None:
+            time_limit = max(time_limit - MOVE_OVERHEAD, 0.01)
+        max_depth = options.get("depth")
+        if max_depth is None and (options.get("infinite") or options.get("ponder") or time_limit is not None or "nodes" in options):
+            max_depth = chess_ai.MAX_DEPTH
+        self.ponder_time_limit = None
+        if options.get("ponder"): # think on the opponent's time, the clock only starts on ponderhit
+            self.ponder_time_limit = time_limit
+            time_limit = None
+        if options.get("infinite") or options.get("ponder"):
+            self.bestmove_allowed.clear()
+        else:
+            self.bestmove_allowed.set()
+        self.search_thread = threading.Thread(target = self.search, args = (time_limit, options.get("nodes"), max_depth), daemon = True)
+        self.search_thread.start()
+
+    def search(self, time_limit, max_nodes, max_depth):
+        valid_moves = self.gs.get_valid_moves()
+        if len(valid_moves) == 0:
+            self.bestmove_allowed.wait()
+            self.send("bestmove 0000")
+            return
+        best_move = self.searcher.find_best_move_iterative(self.gs, valid_moves, time_limit = time_limit, max_nodes = max_nodes,
+                                                           max_depth = max_depth, on_iteration = self.send_info)
+        self.bestmove_allowed.wait() # a mate, MAX_DEPTH or the tablebases can end an infinite search early
+        self.send("bestmove " + best_move.get_chess_notation())
+
+    def send_info(self, depth, score, nodes, seconds, pv):
+        if abs(score) >= chess_ai.CHECKMATE:
+            moves_to_mate = (len(pv) + 1) // 2
+            score_text = "mate " + str(moves_to_mate if score > 0 else -moves_to_mate)
+        elif abs(score) > chess_ai.TABLEBASE_WIN - 256: # tablebase mate, the distance is in the score
+            moves_to_mate = (chess_ai.TABLEBASE_WIN - abs(score) + 2) // 2
+            score_text = "mate " + str(moves_to_mate if score > 0 else -moves_to_mate)
+        else:
+            score_text = "cp " + str(int(round(score * 100)))
+        nps = int(nodes / seconds) if seconds > 0 else 0
+        self.send("info depth " + str(depth) + " score " + score_text + " nodes " + str(nodes) + " nps " + str(nps) +
+                  " time " + str(int(seconds * 1000)) + " pv " + " ".join(move.get_chess_notation() for move in pv))
+
+    # the opponent played the move we pondered on, it's our clock now
+    def ponderhit(self):
+        if self.ponder_time_limit is not None and self.search_thread is not None and self.search_thread.is_alive():
+            self.searcher.deadline = time.perf_counter() + self.ponder_time_limit
+        self.ponder_time_limit = None
+        self.bestmove_allowed.set()
+
+    # end the search, if there is one, and wait for its bestmove
+    def stop(self):
+        self.bestmove_allowed.set()
+        # start_search clears the flag, so keep setting it in case the thread hadn't got that far yet
+        while self.search_thread is not None and self.search_thread.is_alive():
+            self.searcher.stop()
+            self.search_thread.join(0.05)
+        self.wait_for_search()
+
+    def wait_for_search(self):
+        if self.search_thread is not None:
+            self.search_thread.join()
+            self.search_thread = None
+
+
+def main():
+    engine = uci_engine()
+    for line in sys.stdin:
+        if not engine.handle(line.strip()):
+            break
+    engine.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+'''
+Batch evaluation with NumPy - scores thousands of positions at once for labelling training
+data or bulk analysis. Positions are encoded as an (N, 64) int8 array of piece codes (row*8 + col,
+0 for an empty square) plus an (N,) int8 array of flags, and scored with array lookups and sums.
+The scores are exactly chess_ai.score_board's, the tables are built from the same
+piece_square_values and piece_position_scores.
+
+    boards, flags = chess_vector_eval.encode_states(game_states)
+    scores = chess_vector_eval.score_boards(boards, flags) # float64, like score_board
+
+python chess_vector_eval.py --positions 20000      benchmark against score_board
+'''
+import argparse
+import random
+import sys
+import time
+import numpy as np
+import chess_ai, chess_headless
+
+PIECES = ("--", "wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK") # piece code is the index
+WHITE_KING = PIECES.index("wK")
+BLACK_KING = PIECES.index("bK")
+# flags
+WHITE_TO_MOVE = 1
+LATE_GAME = 2 # turn_counter > 70, the enemy king term counts
+CHECKMATE = 4
+STALEMATE = 8
+
+# the two characters of a board square -> piece code, so a whole batch is decoded with one lookup
+CHAR_CODES = np.zeros((256, 256), dtype = np.int8)
+for code, piece in enumerate(PIECES):
+    CHAR_CODES[ord(piece[0]), ord(piece[1])] = code
+
+# tenths of a pawn for every piece code on every square, the same numbers make_move keeps eval_score with
+SQUARE_VALUES = np.zeros((len(PIECES), 64), dtype = np.int32)
+for code, piece in enumerate(PIECES[1:], 1):
+    SQUARE_VALUES[code] = chess_ai.piece_square_values[piece]
+KING_EDGE = 3 * np.array(chess_ai.piece_position_scores["K"], dtype = np.int32).reshape(64)
+SQUARES = np.arange(64)
+
+
+'''
+(boards, flags) for a list of game states. the squares of every board are joined into one
+string and decoded two characters at a time by CHAR_CODES, there's no loop over squares
+'''
+def encode_states(states):
+    text = "".join(["".join(["".join(row) for row in gs.board]) for gs in states])
+    chars = np.frombuffer(text.encode("ascii"), dtype = np.uint8).reshape(len(states), 64, 2)
+    boards = CHAR_CODES[chars[:, :, 0], chars[:, :, 1]]
+    flags = np.array([(WHITE_TO_MOVE if gs.white_to_move else 0) | (LATE_GAME if gs.turn_counter > 70 else 0) |
+                      (CHECKMATE if gs.checkmate else 0) | (STALEMATE if gs.stalemate else 0) for gs in states], dtype = np.int8)
+    return boards, flags
+
+'''
+score_board for every encoded position: material and piece squares summed from SQUARE_VALUES,
+then in the late game both kings' values swapped for the enemy king's edge term, then checkmate
+and stalemate on top
+'''
+def score_boards(boards, flags):
+    totals = SQUARE_VALUES[boards, SQUARES].sum(axis = 1)
+    late = (flags & LATE_GAME) != 0
+    white_to_move = (flags & WHITE_TO_MOVE) != 0
+    black_king = np.argmax(boards == BLACK_KING, axis = 1)
+    white_king = np.argmax(boards == WHITE_KING, axis = 1)
+    edge = np.where(white_to_move, -KING_EDGE[black_king], KING_EDGE[white_king]) - KING_EDGE[white_king] + KING_EDGE[black_king]
+    scores = (totals + np.where(late, edge, 0)) / 10
+    scores = np.where((flags & STALEMATE) != 0, chess_ai.STALEMATE, scores)
+    return np.where((flags & CHECKMATE) != 0, np.where(white_to_move, -chess_ai.CHECKMATE, chess_ai.CHECKMATE), scores)
+
+def score_states(states):
+    return score_boards(*encode_states(states))
+
+
+# positions from random games, some of them late enough for the king term
+def random_positions(count, seed = 1):
+    rng = random.Random(seed)
+    states = []
+    gs = chess_headless.new_game_state()
+    while len(states) < count:
+        valid_moves = gs.get_valid_moves()
+        if len(valid_moves) == 0 or len(gs.move_log) > 150:
+            states.append(gs) # checkmate or stalemate flags are set
+            gs = chess_headless.new_game_state()
+            continue
+        gs.make_move(valid_moves[rng.randrange(len(valid_moves))])
+        gs.turn_counter += 1
+        position = chess_headless.new_game_state(gs.get_fen())
+        position.turn_counter = gs.turn_counter
+        states.append(position)
+    return states
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "check and time the batch evaluator against score_board")
+    parser.add_argument("--positions", type = int, default = 20000)
+    parser.add_argument("--seed", type = int, default = 1)
+    args = parser.parse_args(argv)
+
+    states = random_positions(args.positions, args.seed)
+    start = time.perf_counter()
+    expected = [chess_ai.score_board(gs) for gs in states]
+    single_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    boards, flags = encode_states(states)
+    encode_seconds = time.perf_counter() - start
+    scores = score_boards(boards, flags)
+    batch_seconds = time.perf_counter() - start
+    mismatches = sum(1 for score, want in zip(scores.tolist(), expected) if score != want)
+    print(str(len(states)) + " positions, " + str(mismatches) + " scores differ from score_board")
+    print("score_board: " + str(int(len(states) / single_seconds)) + " positions/s")
+    print("batch: " + str(int(len(states) / batch_seconds)) + " positions/s (encoding " +
+          str(round(100 * encode_seconds / batch_seconds)) + "% of the time)")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())